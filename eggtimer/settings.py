@@ -128,11 +128,54 @@ USE_L10N = True
 
 USE_TZ = True
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# Use a shared Redis cache when available, so all gunicorn workers see the same cached values.
+# Local memory cache is a per-process stand-in for development and tests.
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_URL,
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            }
+        }
     }
-}
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# How statistics are recomputed after a FlowEvent changes:
+#   immediate - recompute inside the save
+#   on_commit - recompute once per user when the surrounding transaction commits
+#   queue - enqueue one background job per user, run after STATISTICS_UPDATE_DELAY seconds, so
+#           all writes within that window are covered by a single recompute
+STATISTICS_UPDATE_MODE = os.environ.get('STATISTICS_UPDATE_MODE', 'immediate')
+STATISTICS_UPDATE_DELAY = int(os.environ.get('STATISTICS_UPDATE_DELAY', '10'))
+
+# Sync responses re-send changes from this many seconds before the client's token, so that
+# writes which committed late are not missed; clients de-duplicate by id
+SYNC_TOKEN_MARGIN = int(os.environ.get('SYNC_TOKEN_MARGIN', '300'))
+# Days for which deletions are kept for sync clients; older sync tokens get a full resync
+SYNC_RETENTION_DAYS = int(os.environ.get('SYNC_RETENTION_DAYS', '90'))
+
+# Seconds for which an API token's user is cached
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.environ.get('AUTH_TOKEN_CACHE_TIMEOUT', '60'))
+
+# Number of future cycles for which ovulation and period dates are projected and stored
+PREDICTION_HORIZON_CYCLES = int(os.environ.get('PREDICTION_HORIZON_CYCLES', '3'))
+
+# Background jobs (see periods.jobs): failed jobs are retried after JOB_RETRY_DELAY seconds,
+# doubling on each attempt
+JOB_RETRY_DELAY = 60
+# Running jobs not finished within JOB_LEASE_TIMEOUT seconds are assumed to have lost their worker,
+# and are claimed again (counting as an attempt)
+JOB_LEASE_TIMEOUT = int(os.environ.get('JOB_LEASE_TIMEOUT', '900'))
+# Days for which finished (done or failed) jobs are kept
+JOB_RETENTION_DAYS = int(os.environ.get('JOB_RETENTION_DAYS', '7'))
 
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATIC_URL = '/static/'
@@ -183,6 +226,8 @@ EMAIL_PORT = 587
 EMAIL_HOST_USER = "apikey"
 EMAIL_HOST_PASSWORD = os.environ.get('SENDGRID_API_KEY')
 EMAIL_USE_TLS = True
+# Number of emails sent over one SMTP connection before it is reopened
+EMAIL_BATCH_SIZE = int(os.environ.get('EMAIL_BATCH_SIZE', 100))
 
 if not EMAIL_HOST_PASSWORD:
     EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
@@ -193,7 +238,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'periods.authentication.CachingTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ),
     'DEFAULT_FILTER_BACKENDS': ('rest_framework.filters.DjangoFilterBackend',)
@@ -20,6 +20,20 @@ class StatisticsAdmin(admin.ModelAdmin):
     search_fields = ['user__email', 'user__first_name', 'user__last_name']
 
 
+class JobAdmin(admin.ModelAdmin):
+
+    list_display = ['name', 'key', 'status', 'attempts', 'run_at', 'updated_at']
+    list_filter = ['name', 'status']
+    search_fields = ['name', 'key', 'last_error']
+
+
+class NotificationLogAdmin(admin.ModelAdmin):
+
+    list_display = ['user', 'notification_type', 'expected_date', 'sent_at']
+    list_filter = ['notification_type', 'sent_at']
+    search_fields = ['user__email', 'user__first_name', 'user__last_name']
+
+
 class UserAdmin(EmailUserAdmin):
 
     list_display = ['email', 'first_name', 'last_name', 'cycle_count', 'date_joined', 'is_active',
@@ -38,4 +52,6 @@ class UserAdmin(EmailUserAdmin):
 
 admin.site.register(models.FlowEvent, FlowAdmin)
 admin.site.register(models.Statistics, StatisticsAdmin)
+admin.site.register(models.Job, JobAdmin)
+admin.site.register(models.NotificationLog, NotificationLogAdmin)
 admin.site.register(get_user_model(), UserAdmin)
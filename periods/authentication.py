@@ -0,0 +1,45 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.translation import ugettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+# The user fields used by the API views; others are loaded on access
+USER_FIELDS = ('id', 'email', 'is_active', 'is_staff', '_timezone', 'luteal_phase_length',
+               'birth_date')
+
+
+def _get_cache_key(key):
+    # Hashed, so that whoever can read the cache does not get usable tokens
+    return 'auth-token-%s' % hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def invalidate_token(key):
+    cache.delete(_get_cache_key(key))
+
+
+class CachingTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that caches the token's user id, so that most requests only fetch the
+    (lean) user. Tokens stay valid for up to AUTH_TOKEN_CACHE_TIMEOUT seconds after being deleted,
+    unless invalidated with invalidate_token.
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = _get_cache_key(key)
+        user_id = cache.get(cache_key)
+        if user_id is None:
+            user_id = self.get_model().objects.filter(key=key).values_list(
+                'user_id', flat=True).first()
+            if user_id is None:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            cache.set(cache_key, user_id, settings.AUTH_TOKEN_CACHE_TIMEOUT)
+
+        user = get_user_model().objects.only(*USER_FIELDS).filter(pk=user_id).first()
+        if not user or not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        return (user, self.get_model()(key=key, user=user))
@@ -0,0 +1,88 @@
+import collections
+import threading
+import time
+
+from django.core.cache import cache
+
+
+# Key families whose hit/miss statistics are reported
+FAMILIES = ('cycle_lengths', 'sorted_cycle_lengths')
+STATS_FIELDS = ('hits', 'misses', 'recompute_ms')
+# Counter increments are summed per process, and written to the cache at most every
+# FLUSH_INTERVAL seconds, so that a lookup does not pay for its own statistics
+FLUSH_INTERVAL = 10
+
+_pending = collections.Counter()
+_pending_lock = threading.Lock()
+_last_flush = time.time()
+
+
+def _get_stats_key(family, field):
+    return 'cache-stats-%s-%s' % (family, field)
+
+
+def _incr(key, delta):
+    # Counters never expire; incr() fails when the counter does not exist yet, and add() when
+    # another process has just created it
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        if not cache.add(key, delta, None):
+            cache.incr(key, delta)
+
+
+def flush():
+    global _last_flush
+    with _pending_lock:
+        pending = dict(_pending)
+        _pending.clear()
+        _last_flush = time.time()
+    for key, delta in pending.items():
+        _incr(key, delta)
+
+
+def increment(key, delta=1):
+    with _pending_lock:
+        _pending[key] += delta
+        due = time.time() - _last_flush >= FLUSH_INTERVAL
+    if due:
+        flush()
+
+
+def get_or_compute(key, family, compute):
+    # Values are stored wrapped in a tuple, so that legitimately empty results such as [] are
+    # not mistaken for a cache miss
+    cached = cache.get(key)
+    if cached is not None:
+        increment(_get_stats_key(family, 'hits'))
+        return cached[0]
+
+    increment(_get_stats_key(family, 'misses'))
+    start = time.time()
+    value = compute()
+    increment(_get_stats_key(family, 'recompute_ms'), int(round((time.time() - start) * 1000)))
+    cache.set(key, (value,))
+    return value
+
+
+def get_stats():
+    flush()
+    keys = [_get_stats_key(family, field) for family in FAMILIES for field in STATS_FIELDS]
+    values = cache.get_many(keys)
+    stats = {}
+    for family in FAMILIES:
+        family_stats = dict((field, values.get(_get_stats_key(family, field), 0))
+                            for field in STATS_FIELDS)
+        lookups = family_stats['hits'] + family_stats['misses']
+        family_stats['hit_rate'] = None
+        if lookups:
+            family_stats['hit_rate'] = round(family_stats['hits'] / lookups, 3)
+        stats[family] = family_stats
+    return stats
+
+
+def reset_stats():
+    with _pending_lock:
+        _pending.clear()
+    cache.delete_many([_get_stats_key(family, field)
+                       for family in FAMILIES for field in STATS_FIELDS])
@@ -1,13 +1,71 @@
+import functools
+import logging
+
 from django.conf import settings
-from django.core.mail import EmailMultiAlternatives
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.template import loader
 from email.utils import formataddr
 
+logger = logging.getLogger(__name__)
 
-def send(recipient, subject, text_body, html_body):
+
+@functools.lru_cache(maxsize=None)
+def get_template(template_name):
+    # Load and compile each email template once per process, rather than once per email
+    return loader.get_template('periods/email/%s' % template_name)
+
+
+def _build_message(recipient, subject, text_body, html_body, connection=None):
     recipients = [formataddr((recipient.get_full_name(), recipient.email))]
     msg = EmailMultiAlternatives(subject, text_body, to=recipients,
-                                 reply_to=settings.REPLY_TO)
+                                 reply_to=settings.REPLY_TO, connection=connection)
     if html_body:
         msg.attach_alternative(html_body, "text/html")
+    return msg
+
+
+def send(recipient, subject, text_body, html_body):
+    msg = _build_message(recipient, subject, text_body, html_body)
     msg.send()
     return True
+
+
+def send_batch(items, batch_size=None, on_sent=None):
+    # Send (recipient, subject, text_body, html_body) items over a single connection, which is
+    # reopened every batch_size messages and after any failure. on_sent, if given, is called with
+    # each item once it has been sent. Returns the number of messages sent and a list of
+    # (recipient, exception) for the messages that failed.
+    batch_size = batch_size or settings.EMAIL_BATCH_SIZE
+    connection = None
+    sent_count = 0
+    failures = []
+    try:
+        for recipient, subject, text_body, html_body in items:
+            if connection is None:
+                connection = get_connection()
+                connection.open()
+                batch_count = 0
+            msg = _build_message(recipient, subject, text_body, html_body, connection=connection)
+            try:
+                connection.send_messages([msg])
+            except Exception as e:
+                logger.exception("Failed to send '%s' to %s", subject, recipient.email)
+                failures.append((recipient, e))
+                try:
+                    connection.close()
+                except Exception:
+                    # The connection may already be broken; a new one is opened for the next message
+                    pass
+                connection = None
+                continue
+            sent_count += 1
+            if on_sent:
+                on_sent(recipient, subject, text_body, html_body)
+            batch_count += 1
+            if batch_count >= batch_size:
+                connection.close()
+                connection = None
+    finally:
+        if connection is not None:
+            connection.close()
+    return sent_count, failures
@@ -0,0 +1,77 @@
+import csv
+import datetime
+import enum
+import json
+
+from rest_framework import renderers
+
+# Same fields as the API's FlowEventSerializer, so exported files can be imported again
+FIELDS = ('id', 'timestamp', 'first_day', 'level', 'color', 'clots', 'cramps', 'comment')
+
+
+def iter_rows(queryset, fields=FIELDS, batch_size=1000):
+    # Stream rows as dicts in id order, one keyset query per batch, so memory use doesn't depend
+    # on the size of the queryset
+    last_id = 0
+    while True:
+        chunk = list(queryset.filter(id__gt=last_id).order_by('id').values(
+            'id', *[field for field in fields if field != 'id'])[:batch_size])
+        if not chunk:
+            return
+        for row in chunk:
+            for field, value in row.items():
+                if isinstance(value, enum.Enum):
+                    row[field] = value.value
+                elif isinstance(value, datetime.datetime):
+                    row[field] = value.isoformat()
+            yield row
+        if len(chunk) < batch_size:
+            return
+        last_id = chunk[-1]['id']
+
+
+class _Echo(object):
+    # File-like object for csv.writer, returning each line rather than storing it
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows, fields=FIELDS):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow(['' if row[field] is None else row[field] for field in fields])
+
+
+def ndjson_lines(rows, fields=FIELDS):
+    for row in rows:
+        yield json.dumps(row) + '\n'
+
+
+class CSVRenderer(renderers.BaseRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Exports are streamed; this only renders other responses, e.g. errors
+        rows = data if isinstance(data, list) else [data]
+        fields = list(rows[0]) if rows else []
+        return ''.join(csv_lines(rows, fields))
+
+
+class NDJSONRenderer(renderers.BaseRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        rows = data if isinstance(data, list) else [data]
+        return ''.join(ndjson_lines(rows))
+
+
+RENDERERS = [CSVRenderer, NDJSONRenderer]
+LINES = {
+    CSVRenderer.format: csv_lines,
+    NDJSONRenderer.format: ndjson_lines,
+}
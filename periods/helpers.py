@@ -1,5 +1,8 @@
 from django.conf import settings
 from django.contrib.sites.models import Site
+from django.db import connections
+from django.db.models import Case, Value, When
+from django.db.models.functions import Cast
 
 
 def get_full_domain():
@@ -7,3 +10,28 @@ def get_full_domain():
     if not settings.SECURE_SSL_REDIRECT:
         scheme = 'http'
     return '%s://%s' % (scheme, Site.objects.get_current().domain)
+
+
+def bulk_update(objs, fields, batch_size=500):
+    # Write the given fields of many objects with one UPDATE per batch, without sending signals.
+    # Each column is set with CASE WHEN pk=... THEN value, as QuerySet.bulk_update does in later
+    # Django versions.
+    objs = list(objs)
+    if not objs:
+        return
+    model = objs[0]._meta.model
+    manager = model._default_manager
+    connection = connections[manager.db]
+    for start in range(0, len(objs), batch_size):
+        batch = objs[start:start + batch_size]
+        values = {}
+        for field_name in fields:
+            field = model._meta.get_field(field_name)
+            value = Case(*[When(pk=obj.pk, then=Value(getattr(obj, field.attname),
+                                                      output_field=field)) for obj in batch],
+                         output_field=field)
+            if connection.vendor == 'postgresql':
+                # PostgreSQL can't infer the type of CASE results from untyped parameters
+                value = Cast(value, output_field=field)
+            values[field.attname] = value
+        manager.filter(pk__in=[obj.pk for obj in batch]).update(**values)
@@ -0,0 +1,91 @@
+import csv
+import json
+import os
+
+from django.db import transaction
+
+from periods import models as period_models, serializers
+
+FORMATS = ('csv', 'ndjson')
+EXTENSIONS = {
+    '.csv': 'csv',
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+}
+# Only this many failed rows are described in the summary; all are counted
+MAX_REPORTED_ERRORS = 100
+
+
+def get_format(upload):
+    # Use the file extension if it is known, otherwise guess from the first character
+    import_format = EXTENSIONS.get(os.path.splitext(upload.name or '')[1].lower())
+    if not import_format:
+        first_line = next(iter(upload), b'').lstrip()
+        upload.seek(0)
+        import_format = 'ndjson' if first_line.startswith(b'{') else 'csv'
+    return import_format
+
+
+def _decode(lines):
+    for line in lines:
+        yield line.decode('utf-8-sig') if isinstance(line, bytes) else line
+
+
+def iter_csv_rows(lines):
+    # Yields (line number, row), leaving out empty values so that field defaults apply
+    reader = csv.DictReader(_decode(lines))
+    for row in reader:
+        yield reader.line_num, dict((key, value) for key, value in row.items()
+                                    if key and value not in ('', None))
+
+
+def iter_ndjson_rows(lines):
+    for line_number, line in enumerate(_decode(lines), 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        if not isinstance(row, dict):
+            row = ValueError("Invalid JSON object")
+        yield line_number, row
+
+
+ROWS = {
+    'csv': iter_csv_rows,
+    'ndjson': iter_ndjson_rows,
+}
+
+
+def import_flow_events(user, rows, batch_size=500):
+    # Validate rows with the API serializer and create events in batches; cycles and statistics
+    # are rebuilt once, at the end. The whole import is one transaction, so that a failure
+    # partway through never leaves events committed without their cycles
+    created = 0
+    failed = 0
+    errors = []
+    batch = []
+    with transaction.atomic(), period_models.FlowEventBatch(user):
+        for line_number, row in rows:
+            if isinstance(row, Exception):
+                row_errors = {'non_field_errors': [str(row)]}
+            else:
+                serializer = serializers.FlowEventSerializer(data=row)
+                row_errors = None if serializer.is_valid() else serializer.errors
+            if row_errors:
+                failed += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({'line': line_number, 'errors': row_errors})
+                continue
+            batch.append(period_models.FlowEvent(user=user, **serializer.validated_data))
+            if len(batch) >= batch_size:
+                created += _create(batch)
+                batch = []
+        created += _create(batch)
+    return {'created': created, 'failed': failed, 'errors': errors}
+
+
+def _create(flow_events):
+    period_models.FlowEvent.objects.bulk_create(flow_events)
+    return len(flow_events)
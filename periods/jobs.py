@@ -0,0 +1,128 @@
+import datetime
+import functools
+import logging
+import traceback
+from concurrent import futures
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from periods import email_sender, models as period_models
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+
+def task(name):
+    def register(func):
+        TASKS[name] = func
+        return func
+    return register
+
+
+@task('send_email')
+def send_email(user_id, subject, text_body, html_body=None, notification=None):
+    # notification, if given, is the [notification_type, expected_date] of a NotificationLog
+    # entry: the email is skipped if it is already logged, and logged once sent
+    user = period_models.User.objects.get(pk=user_id)
+    if notification:
+        ledger = period_models.NotificationLog.objects.filter(
+            user=user, notification_type=notification[0],
+            expected_date=parse_date(notification[1]))
+        if ledger.exists():
+            return
+    email_sender.send(user, subject, text_body, html_body)
+    if notification:
+        period_models.NotificationLog.objects.get_or_create(
+            user=user, notification_type=notification[0],
+            expected_date=parse_date(notification[1]))
+
+
+@task('update_statistics')
+def update_statistics(user_id):
+    user = period_models.User.objects.filter(pk=user_id).first()
+    if user:
+        period_models.recompute_statistics(user)
+
+
+@task('prefetch_moon_phases')
+def prefetch_moon_phases(from_date, to_date):
+    period_models.AerisData.get_for_date(from_date, to_date, prefetch_next=False)
+
+
+def claim(job):
+    # Conditional update on the status and updated_at that were read, so that only one worker
+    # can claim a job: a queued one, or a running one whose lease has expired
+    now = timezone.now()
+    jobs = period_models.Job.objects.filter(pk=job.pk, status=job.status,
+                                            updated_at=job.updated_at)
+    if job.status == period_models.JobStatus.RUNNING and job.attempts >= job.max_attempts:
+        jobs.update(status=period_models.JobStatus.FAILED, updated_at=now,
+                    last_error='Worker lost after %s attempts' % job.attempts)
+        return False
+    claimed = jobs.update(status=period_models.JobStatus.RUNNING, attempts=job.attempts + 1,
+                          updated_at=now)
+    if claimed:
+        job.status = period_models.JobStatus.RUNNING
+        job.attempts += 1
+        job.updated_at = now
+    return bool(claimed)
+
+
+def run_job(job):
+    try:
+        TASKS[job.name](**job.kwargs)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            job.status = period_models.JobStatus.QUEUED
+            delay = settings.JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+            job.run_at = timezone.now() + datetime.timedelta(seconds=delay)
+        else:
+            job.status = period_models.JobStatus.FAILED
+        logger.warning("Job %s %s failed (attempt %s)", job.pk, job.name, job.attempts)
+    else:
+        job.status = period_models.JobStatus.DONE
+    job.save(update_fields=['status', 'run_at', 'last_error', 'updated_at'])
+    return job.status
+
+
+def _process(job, threaded=False):
+    try:
+        if claim(job):
+            return run_job(job)
+        return None
+    finally:
+        if threaded:
+            # Each worker thread opens its own database connection
+            connection.close()
+
+
+def get_due_jobs(limit):
+    # Queued jobs that are due, and running jobs whose worker has not finished within the lease
+    # (e.g. because it was killed), oldest first
+    now = timezone.now()
+    lease_expired = now - datetime.timedelta(seconds=settings.JOB_LEASE_TIMEOUT)
+    return list(period_models.Job.objects.filter(
+        Q(status=period_models.JobStatus.QUEUED, run_at__lte=now) |
+        Q(status=period_models.JobStatus.RUNNING, updated_at__lt=lease_expired)).order_by(
+        'run_at', 'id')[:limit])
+
+
+def run_pending(workers=1, limit=100):
+    # Run up to limit due jobs using the given number of worker threads; returns a count of jobs
+    # by resulting status (None for jobs claimed by another worker)
+    jobs = get_due_jobs(limit)
+    if workers > 1:
+        with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            statuses = list(executor.map(functools.partial(_process, threaded=True), jobs))
+    else:
+        statuses = [_process(job) for job in jobs]
+    results = {}
+    for status in statuses:
+        results[status] = results.get(status, 0) + 1
+    return results
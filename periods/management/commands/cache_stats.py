@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from periods import caching
+
+
+class Command(BaseCommand):
+    help = 'Show cache hit/miss statistics for each key family'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', dest='reset', default=False,
+                            help='Reset all counters after displaying them.')
+
+    def handle(self, *args, **options):
+        stats = caching.get_stats()
+        self.stdout.write("%-25s %10s %10s %10s %14s" % (
+            'family', 'hits', 'misses', 'hit rate', 'recompute ms'))
+        for family in caching.FAMILIES:
+            family_stats = stats[family]
+            hit_rate = family_stats['hit_rate']
+            if hit_rate is None:
+                hit_rate = '-'
+            self.stdout.write("%-25s %10s %10s %10s %14s" % (
+                family, family_stats['hits'], family_stats['misses'], hit_rate,
+                family_stats['recompute_ms']))
+
+        if options.get('reset'):
+            caching.reset_stats()
+            self.stdout.write("Counters reset")
@@ -1,5 +1,9 @@
+import datetime
+
+import pytz
+
 from django.core.management.base import BaseCommand
-from django.template.loader import get_template
+from django.db.models import Case, Count, Max, Q, When
 
 from periods import models as period_models, email_sender
 
@@ -11,18 +15,26 @@ class Command(BaseCommand):
         parser.add_argument('--noinput', '--no-input',
                             action='store_false', dest='interactive', default=True,
                             help='Tells Django to NOT prompt the user for input of any kind.')
+        parser.add_argument('--queue', action='store_true', dest='queue', default=False,
+                            help='Enqueue emails as background jobs instead of sending them now.')
+        parser.add_argument('--batch-size', type=int, dest='batch_size',
+                            help='Number of emails to send per SMTP connection.')
 
     def handle(self, *args, **options):
         interactive = options.get('interactive')
 
-        users = period_models.User.objects.filter(
-            is_active=True, flow_events__isnull=False, statistics__isnull=False).exclude(
-            send_emails=False).distinct()
-        active_users = []
-        for user in users:
-            # Don't email users who haven't tracked a period in over 3 months
-            if user.statistics.current_cycle_length < 90:
-                active_users.append(user)
+        # Don't email users who haven't tracked a period in over 3 months, i.e. whose current
+        # cycle (counted in UTC days, as in Statistics.current_cycle_length) is 90 days or more
+        now = period_models.today()
+        cutoff = pytz.utc.localize(datetime.datetime.combine(
+            now.date() - datetime.timedelta(days=89), datetime.time()))
+        active_users = list(period_models.User.objects.filter(
+            is_active=True, statistics__isnull=False).exclude(send_emails=False).annotate(
+            last_period=Max(Case(When(flow_events__first_day=True, flow_events__timestamp__lte=now,
+                                      then='flow_events__timestamp'))),
+            flow_event_count=Count('flow_events')).filter(
+            Q(last_period=None) | Q(last_period__gte=cutoff),
+            flow_event_count__gt=0).order_by('id'))
 
         if interactive:
             confirm = input("""You are about to email %s users about their accounts.
@@ -36,11 +48,21 @@ Are you sure you want to do this?
             subject = 'Important information about the data in your eggtimer account'
             template_name = 'notification'
             context = {}
-            plaintext = get_template('periods/email/%s.txt' % template_name)
-            for user in active_users:
-                email_sender.send(user, subject, plaintext.render(context), None)
+            plaintext = email_sender.get_template('%s.txt' % template_name)
+            text_body = plaintext.render(context)
+            if options.get('queue'):
+                for user in active_users:
+                    period_models.Job.enqueue('send_email', user_id=user.pk, subject=subject,
+                                              text_body=text_body)
+            else:
+                sent_count, failures = email_sender.send_batch(
+                    [(user, subject, text_body, None) for user in active_users],
+                    options.get('batch_size'))
+                for user, error in failures:
+                    self.stderr.write("Failed to email %s: %s" % (user.email, error))
+                self.stdout.write("Sent %s emails, %s failed" % (sent_count, len(failures)))
         else:
             print("Would have emailed the following %s users:\n-------------------------"
                   % len(active_users))
             for user in active_users:
-                print("%35s %5s periods" % (user.email, user.flow_events.count()))
+                print("%35s %5s periods" % (user.email, user.flow_event_count))
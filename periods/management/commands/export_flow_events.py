@@ -0,0 +1,35 @@
+import datetime
+import gzip
+
+from django.core.management.base import BaseCommand
+
+from periods import exporters, models as period_models
+
+
+class Command(BaseCommand):
+    help = "Export all users' flow events to a gzip-compressed CSV or NDJSON file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(exporters.LINES), default='csv',
+                            dest='export_format', help='Export file format.')
+        parser.add_argument('--output', help='Output file name (default flow_events-<date>.'
+                                             '<format>.gz).')
+        parser.add_argument('--batch-size', type=int, dest='batch_size', default=1000,
+                            help='Number of flow events to read at a time.')
+
+    def handle(self, *args, **options):
+        export_format = options.get('export_format') or 'csv'
+        output = options.get('output') or 'flow_events-%s.%s.gz' % (
+            datetime.date.today().isoformat(), export_format)
+        fields = ('user',) + exporters.FIELDS
+        rows = exporters.iter_rows(period_models.FlowEvent.objects.all(), fields,
+                                   options.get('batch_size') or 1000)
+        count = 0
+        with gzip.open(output, 'wt', encoding='utf-8', newline='') as export_file:
+            for line in exporters.LINES[export_format](rows, fields):
+                export_file.write(line)
+                count += 1
+        if export_format == 'csv':
+            # Header line
+            count -= 1
+        self.stdout.write("Exported %s flow events to %s" % (count, output))
@@ -1,8 +1,12 @@
+import time
+
 import pytz
 
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
 
-from periods import models as period_models
+from periods import helpers, models as period_models
 
 
 class Command(BaseCommand):
@@ -12,30 +16,66 @@ class Command(BaseCommand):
         parser.add_argument('--noinput', '--no-input',
                             action='store_false', dest='interactive', default=True,
                             help='Tells Django to NOT prompt the user for input of any kind.')
+        parser.add_argument('--dry-run', action='store_true', dest='dry_run', default=False,
+                            help='Print the changes that would be made, without saving them.')
+        parser.add_argument('--batch-size', type=int, dest='batch_size', default=1000,
+                            help='Number of flow events to read and write at a time.')
+
+    def _get_chunks(self, flow_events, batch_size):
+        # Stream flow events in id order, in chunks of at most batch_size
+        last_id = 0
+        while True:
+            chunk = list(flow_events.filter(id__gt=last_id).order_by('id')[:batch_size].iterator())
+            if not chunk:
+                return
+            yield chunk
+            last_id = chunk[-1].id
 
     def handle(self, *args, **options):
         interactive = options.get('interactive')
+        dry_run = options.get('dry_run')
+        batch_size = options.get('batch_size') or 1000
 
         users = period_models.User.objects.filter(
             flow_events__isnull=False).distinct()
 
-        if interactive:
+        if interactive and not dry_run:
             users_info = ['\t%s (%s)' % (user.email, user.timezone) for user in users]
             confirm = input("""You are about to update flow events for the following users:\n%s
 Are you sure you want to do this?
 
     Type 'yes' to continue, or 'no' to cancel: """ % "\n".join(users_info))
-        else:
-            confirm = 'yes'
-
-        for user in users:
-            user_timezone = pytz.timezone(user._timezone.zone)
-            print("User: %s (%s)" % (user.email, user_timezone))
-            for flow_event in user.flow_events.all().order_by('timestamp'):
-                timestamp = flow_event.timestamp
-                utc_timestamp = timestamp.astimezone(pytz.utc)
-                if confirm == 'yes':
-                    flow_event.timestamp = utc_timestamp
-                    flow_event.save()
-                else:
-                    print("\t%s -> %s" % (flow_event.timestamp, utc_timestamp))
+            dry_run = confirm != 'yes'
+
+        flow_events = period_models.FlowEvent.objects.exclude(user=None).select_related('user')
+        total = flow_events.count()
+        started = time.time()
+        processed = 0
+        for chunk in self._get_chunks(flow_events, batch_size):
+            now = timezone.now()
+            for flow_event in chunk:
+                utc_timestamp = flow_event.timestamp.astimezone(pytz.utc)
+                if dry_run:
+                    self.stdout.write("%s (%s)\t%s -> %s" % (
+                        flow_event.user.email, flow_event.user.timezone, flow_event.timestamp,
+                        utc_timestamp))
+                flow_event.timestamp = utc_timestamp
+                flow_event.updated_at = now
+            if not dry_run:
+                # Written without sending signals; cycles and statistics are rebuilt per user below
+                with transaction.atomic():
+                    helpers.bulk_update(chunk, ['timestamp', 'updated_at'])
+            processed += len(chunk)
+            elapsed = time.time() - started
+            self.stdout.write("Processed %s/%s flow events in %.1fs (%.0f events/s)" % (
+                processed, total, elapsed, processed / elapsed if elapsed else 0))
+
+        if dry_run:
+            return
+        user_count = 0
+        for user in users.order_by('id').iterator():
+            with transaction.atomic():
+                user.rebuild_cycles()
+                period_models.recompute_statistics(user)
+            user_count += 1
+        self.stdout.write("Updated %s flow events for %s users" % (processed, user_count))
@@ -1,62 +1,203 @@
+import argparse
 import datetime
+import functools
+import time
+from concurrent import futures
 
 from django.conf import settings
 from django.core.management.base import BaseCommand
-from django.template.loader import get_template
+from django.db import connection
+from django.db.models import F, Q
 
 from periods import models as period_models, email_sender, helpers
 
+# Number of users processed between checkpoints
+CHECKPOINT_INTERVAL = 100
+
+
+def parse_shard(value):
+    try:
+        shard, num_shards = [int(part) for part in value.split('/')]
+    except ValueError:
+        raise argparse.ArgumentTypeError("Shard must be given as i/n, e.g. 0/4")
+    if not 0 <= shard < num_shards:
+        raise argparse.ArgumentTypeError("Shard i/n must have 0 <= i < n")
+    return shard, num_shards
+
 
 class Command(BaseCommand):
     help = 'Notify users of upcoming periods'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--queue', action='store_true', dest='queue', default=False,
+                            help='Enqueue emails as background jobs instead of sending them now.')
+        parser.add_argument('--batch-size', type=int, dest='batch_size',
+                            help='Number of emails to send per SMTP connection.')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Number of threads sending email, each over its own connection.')
+        parser.add_argument('--shard', type=parse_shard,
+                            help='Only notify users in shard i of n (i/n, 0 <= i < n), i.e. those '
+                                 'with id % n == i, so that several processes can share the work.')
+        parser.add_argument('--resume', action='store_true', default=False,
+                            help="Skip users already processed by an interrupted run today.")
+
     def _format_date(self, date_value):
         return date_value.strftime('%A %B %d, %Y')
 
+    def _get_notification(self, user):
+        # Return (notification_type, subject, text_body, html_body) for the notification due
+        # today, if any. The type includes the number of days to the expected date, as some
+        # notifications are repeated daily.
+        today = period_models.today()
+        expected_date = user.statistics.next_period_date
+        calendar_start_date = expected_date - datetime.timedelta(days=7)
+        expected_in = (expected_date - today.date()).days
+        expected_abs = abs(expected_in)
+        if expected_abs == 1:
+            day = 'day'
+        else:
+            day = 'days'
+
+        context = {
+            'full_name': user.get_full_name(),
+            'today': self._format_date(today),
+            'expected_in': expected_abs,
+            'day': day,
+            'expected_date': self._format_date(expected_date),
+            'calendar_start_date': self._format_date(calendar_start_date),
+            'admin_name': settings.ADMINS[0][0],
+            'full_domain': helpers.get_full_domain(),
+        }
+
+        subject = ''
+        if expected_in < 0:
+            subject = "Period was expected %s %s ago" % (expected_abs, day)
+            template_name = 'expected_ago'
+        elif expected_in == 0:
+            subject = "Period today!"
+            template_name = 'expected_now'
+        elif expected_in < 4:
+            subject = "Period starting"
+            template_name = 'expected_in'
+        elif expected_in == user.luteal_phase_length:
+            subject = "Ovulation today!"
+            template_name = 'ovulating'
+        if not subject:
+            return None
+        plaintext = email_sender.get_template('%s.txt' % template_name)
+        html = email_sender.get_template('%s.html' % template_name)
+        notification_type = '%s:%s' % (template_name, expected_in)
+        return notification_type, subject, plaintext.render(context), html.render(context)
+
+    def _get_emails(self, users, ledger_keys, checkpoint=None):
+        # Yield the emails due for users, ordered by id, skipping those already in the ledger.
+        # The ledger key of each email is recorded in ledger_keys by user id.
+        logged = set(period_models.NotificationLog.objects.filter(
+            user__in=users, expected_date=F('user__statistics__next_period_date')).values_list(
+            'user_id', 'notification_type'))
+        last_id = None
+        for i, user in enumerate(users.order_by('id')):
+            if checkpoint and i % CHECKPOINT_INTERVAL == 0 and last_id:
+                # Emails are sent as they are generated, so all users up to here are done
+                self._save_checkpoint(checkpoint, last_id, ledger_keys)
+            notification = self._get_notification(user)
+            if notification and (user.pk, notification[0]) not in logged:
+                ledger_keys[user.pk] = (notification[0], user.statistics.next_period_date)
+                yield (user,) + notification[1:]
+            last_id = user.pk
+        if checkpoint and last_id:
+            self._save_checkpoint(checkpoint, last_id, ledger_keys)
+
+    def _save_checkpoint(self, checkpoint, last_id, ledger_keys):
+        # Users whose email failed are still in ledger_keys; stop short of the first of them, so
+        # that a resumed run tries them again
+        if ledger_keys:
+            last_id = min(last_id, min(ledger_keys) - 1)
+        checkpoint.last_id = last_id
+        checkpoint.save(update_fields=['last_id', 'updated_at'])
+
+    def _log_sent(self, ledger_keys, user):
+        notification_type, expected_date = ledger_keys.pop(user.pk)
+        period_models.NotificationLog.objects.get_or_create(
+            user=user, notification_type=notification_type, expected_date=expected_date)
+
+    def _get_checkpoint(self, partition, run_date, resume):
+        checkpoint, created = period_models.Checkpoint.objects.get_or_create(
+            name='notify_upcoming_period:%s/%s' % partition, run_date=run_date)
+        if not resume:
+            checkpoint.last_id = 0
+        return checkpoint
+
+    def _filter_partition(self, users, partition):
+        # Partitions are fixed by user id, so they do not move as the set of users changes
+        index, num_partitions = partition
+        if num_partitions == 1:
+            return users
+        return users.annotate(id_mod=F('id') % num_partitions).filter(id_mod=index)
+
+    def _send_partition(self, users, partition, batch_size, resume=False, threaded=False):
+        started = time.time()
+        ledger_keys = {}
+        try:
+            checkpoint = self._get_checkpoint(partition, period_models.today().date(), resume)
+            users = self._filter_partition(users, partition).filter(id__gt=checkpoint.last_id)
+            emails = self._get_emails(users, ledger_keys, checkpoint)
+            sent_count, failures = email_sender.send_batch(
+                emails, batch_size, on_sent=lambda user, *args: self._log_sent(ledger_keys, user))
+        finally:
+            if threaded:
+                # Each worker thread opens its own database connection
+                connection.close()
+        return sent_count, failures, time.time() - started
+
     def handle(self, *args, **options):
-        users = period_models.User.objects.filter(
-            is_active=True, flow_events__isnull=False, statistics__isnull=False).exclude(
-            send_emails=False).distinct()
-        for user in users:
-            today = period_models.today()
-            upcoming_events = user.statistics.predicted_events
-            if not upcoming_events:
-                continue
-            # The upcoming events are in date order, ovulation/period/ovulation/...
-            expected_date = upcoming_events[1]['timestamp']
-            calendar_start_date = expected_date - datetime.timedelta(days=7)
-            expected_in = (expected_date - today.date()).days
-            expected_abs = abs(expected_in)
-            if expected_abs == 1:
-                day = 'day'
-            else:
-                day = 'days'
-
-            context = {
-                'full_name': user.get_full_name(),
-                'today': self._format_date(today),
-                'expected_in': expected_abs,
-                'day': day,
-                'expected_date': self._format_date(expected_date),
-                'calendar_start_date': self._format_date(calendar_start_date),
-                'admin_name': settings.ADMINS[0][0],
-                'full_domain': helpers.get_full_domain(),
-            }
-
-            subject = ''
-            if expected_in < 0:
-                subject = "Period was expected %s %s ago" % (expected_abs, day)
-                template_name = 'expected_ago'
-            elif expected_in == 0:
-                subject = "Period today!"
-                template_name = 'expected_now'
-            elif expected_in < 4:
-                subject = "Period starting"
-                template_name = 'expected_in'
-            elif expected_in == user.luteal_phase_length:
-                subject = "Ovulation today!"
-                template_name = 'ovulating'
-            if subject:
-                plaintext = get_template('periods/email/%s.txt' % template_name)
-                html = get_template('periods/email/%s.html' % template_name)
-                email_sender.send(user, subject, plaintext.render(context), html.render(context))
+        # Only select users with a notification due today: the next period is expected within a
+        # few days (or is overdue), or they are expected to be ovulating today
+        today_date = period_models.today().date()
+        users = period_models.User.objects.filter(is_active=True, send_emails=True).filter(
+            Q(statistics__next_period_date__lte=today_date + datetime.timedelta(days=3)) |
+            Q(statistics__next_ovulation_date=today_date)).select_related('statistics')
+
+        # Shard i of n has the users with id % n == i. Within the shard, worker j of w has those
+        # with id % (n * w) == i + n * j, each with its own checkpoint.
+        shard, num_shards = options.get('shard') or (0, 1)
+        workers = options.get('workers') or 1
+        if not users.exists():
+            return
+        partitions = [(shard + num_shards * worker, num_shards * workers)
+                      for worker in range(workers)]
+
+        if options.get('queue'):
+            ledger_keys = {}
+            for user, subject, text_body, html_body in self._get_emails(
+                    self._filter_partition(users, (shard, num_shards)), ledger_keys):
+                # The job records the email in the ledger once it has been sent
+                notification_type, expected_date = ledger_keys.pop(user.pk)
+                period_models.Job.enqueue(
+                    'send_email', key='%s:%s:%s' % (user.pk, notification_type, expected_date),
+                    user_id=user.pk, subject=subject, text_body=text_body, html_body=html_body,
+                    notification=[notification_type, expected_date.isoformat()])
+            return
+
+        send_partition = functools.partial(self._send_partition, users,
+                                           batch_size=options.get('batch_size'),
+                                           resume=options.get('resume'), threaded=workers > 1)
+        if workers > 1:
+            with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(send_partition, partitions))
+        else:
+            results = [send_partition(partition) for partition in partitions]
+
+        total_sent = total_failed = 0
+        for (index, num_partitions), (sent_count, failures, elapsed) in zip(partitions, results):
+            for user, error in failures:
+                self.stderr.write("Failed to email %s: %s" % (user.email, error))
+            if sent_count or failures:
+                self.stdout.write(
+                    "Users with id %% %s == %s: sent %s, failed %s in %.1fs (%.1f emails/s)" % (
+                        num_partitions, index, sent_count, len(failures), elapsed,
+                        sent_count / elapsed if elapsed else 0))
+            total_sent += sent_count
+            total_failed += len(failures)
+        if total_sent or total_failed:
+            self.stdout.write("Sent %s emails, %s failed" % (total_sent, total_failed))
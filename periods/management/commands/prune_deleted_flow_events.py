@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from periods import models as period_models
+
+
+class Command(BaseCommand):
+    help = 'Delete records of deleted flow events that are older than the sync retention period'
+
+    def handle(self, *args, **options):
+        count, _ = period_models.DeletedFlowEvent.objects.filter(
+            deleted_at__lt=period_models.get_tombstone_cutoff()).delete()
+        self.stdout.write("Pruned %s deleted flow events" % count)
@@ -0,0 +1,18 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from periods import models as period_models
+
+
+class Command(BaseCommand):
+    help = 'Delete finished background jobs that are older than the job retention period'
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - datetime.timedelta(days=settings.JOB_RETENTION_DAYS)
+        count, _ = period_models.Job.objects.filter(
+            status__in=[period_models.JobStatus.DONE, period_models.JobStatus.FAILED],
+            updated_at__lt=cutoff).delete()
+        self.stdout.write("Pruned %s jobs" % count)
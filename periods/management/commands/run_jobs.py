@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from periods import jobs, models as period_models
+
+
+class Command(BaseCommand):
+    help = 'Process queued background jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Number of jobs to process concurrently.')
+        parser.add_argument('--batch-size', type=int, default=100, dest='batch_size',
+                            help='Maximum number of jobs to fetch at a time.')
+        parser.add_argument('--burst', action='store_true', default=False,
+                            help='Exit once there are no more due jobs, instead of polling.')
+        parser.add_argument('--sleep', type=float, default=5,
+                            help='Seconds to wait between polls when the queue is empty.')
+
+    def _get_label(self, status):
+        if status is None:
+            return 'skipped'
+        return period_models.JobStatus.label(status).lower()
+
+    def handle(self, *args, **options):
+        workers = options.get('workers', 4)
+        batch_size = options.get('batch_size', 100)
+        while True:
+            close_old_connections()
+            results = jobs.run_pending(workers=workers, limit=batch_size)
+            if results:
+                self.stdout.write(', '.join('%s %s' % (count, self._get_label(status))
+                                            for status, count in sorted(results.items(), key=str)))
+            elif options.get('burst'):
+                break
+            else:
+                time.sleep(options.get('sleep', 5))
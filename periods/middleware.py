@@ -1,10 +1,44 @@
-class AddAuthTokenMiddleware(object):
+import time
+
+from django.contrib import auth
+from django.utils.deprecation import MiddlewareMixin
+from rest_framework.authtoken.models import Token
+
+# Session key caching the user's auth token key, with the time it was last checked
+AUTH_TOKEN_SESSION_KEY = 'auth_token'
+# Seconds after which the cached key is checked against the database again, in case the token
+# was regenerated from another session or deleted
+AUTH_TOKEN_CHECK_INTERVAL = 300
+
+
+def set_session_token(session, token_key):
+    session[AUTH_TOKEN_SESSION_KEY] = {'key': token_key, 'checked': time.time()}
+
+
+class AddAuthTokenMiddleware(MiddlewareMixin):
     """
-        Adds auth_token cookie to response
+        Adds auth_token cookie to response, when the browser does not already have the current one
     """
     def process_response(self, request, response):
-        if hasattr(request, 'user') and request.user and request.user.is_authenticated():
-            auth_token = request.user.auth_token
-            if auth_token:
-                response.set_cookie('auth_token', auth_token)
+        # Only browser sessions get the cookie; API clients authenticate with the Authorization
+        # header, and must not have a session created for them
+        session = getattr(request, 'session', None)
+        if (session is None or auth.SESSION_KEY not in session or
+                'HTTP_AUTHORIZATION' in request.META):
+            return response
+        user = getattr(request, 'user', None)
+        if not user or not user.is_authenticated():
+            return response
+
+        cached = session.get(AUTH_TOKEN_SESSION_KEY)
+        if isinstance(cached, dict) and time.time() - cached['checked'] < AUTH_TOKEN_CHECK_INTERVAL:
+            token_key = cached['key']
+        else:
+            token_key = Token.objects.filter(user=user).values_list('key', flat=True).first()
+            if not token_key:
+                session.pop(AUTH_TOKEN_SESSION_KEY, None)
+                return response
+            set_session_token(session, token_key)
+        if request.COOKIES.get('auth_token') != token_key:
+            response.set_cookie('auth_token', token_key)
         return response
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 16:19
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('periods', '0015_aerisdata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Cycle',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.IntegerField()),
+                ('start_date', models.DateField()),
+                ('length', models.IntegerField(blank=True, null=True)),
+                ('flow_event', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='cycle', to='periods.FlowEvent')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cycles', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['user', 'index'],
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='cycle',
+            index_together=set([('user', 'index')]),
+        ),
+    ]
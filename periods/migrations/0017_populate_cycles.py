@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import pytz
+
+from django.db import migrations
+
+
+def populate_cycles(apps, schema_editor):
+    User = apps.get_model('periods', 'User')
+    FlowEvent = apps.get_model('periods', 'FlowEvent')
+    Cycle = apps.get_model('periods', 'Cycle')
+    for user in User.objects.all():
+        first_days = FlowEvent.objects.filter(user=user, first_day=True).order_by('timestamp')
+        first_days = [(pk, timestamp.astimezone(pytz.utc).date())
+                      for pk, timestamp in first_days.values_list('pk', 'timestamp')]
+        cycles = []
+        for index, (pk, start_date) in enumerate(first_days):
+            length = None
+            if index + 1 < len(first_days):
+                length = (first_days[index + 1][1] - start_date).days
+            cycles.append(Cycle(user=user, flow_event_id=pk, index=index, start_date=start_date,
+                                length=length))
+        Cycle.objects.bulk_create(cycles)
+
+
+def reverse_populate_cycles(apps, schema_editor):
+    apps.get_model('periods', 'Cycle').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('periods', '0016_cycle'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_cycles, reverse_populate_cycles),
+    ]
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 16:22
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+FIRST_DAY_INDEX_NAME = 'periods_flowevent_first_day_user_timestamp'
+# Partial indexes are not supported by the ORM in this Django version, and the condition must
+# match the SQL each backend generates for first_day=True
+FIRST_DAY_INDEX_CONDITIONS = {
+    'postgresql': 'first_day',
+    'sqlite': 'first_day = 1',
+}
+
+
+def create_first_day_index(apps, schema_editor):
+    condition = FIRST_DAY_INDEX_CONDITIONS.get(schema_editor.connection.vendor)
+    if condition:
+        schema_editor.execute(
+            'CREATE INDEX %s ON periods_flowevent (user_id, timestamp) WHERE %s' % (
+                FIRST_DAY_INDEX_NAME, condition))
+
+
+def drop_first_day_index(apps, schema_editor):
+    if schema_editor.connection.vendor in FIRST_DAY_INDEX_CONDITIONS:
+        schema_editor.execute('DROP INDEX IF EXISTS %s' % FIRST_DAY_INDEX_NAME)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('periods', '0017_populate_cycles'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='flowevent',
+            index_together=set([('user', 'timestamp')]),
+        ),
+        migrations.RunPython(create_first_day_index, drop_first_day_index),
+    ]
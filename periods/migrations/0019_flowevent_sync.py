@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 16:40
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('periods', '0018_flowevent_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletedFlowEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('flow_event_id', models.IntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='deleted_flow_events', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='flowevent',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AlterIndexTogether(
+            name='flowevent',
+            index_together=set([('user', 'timestamp'), ('user', 'updated_at')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='deletedflowevent',
+            index_together=set([('user', 'deleted_at')]),
+        ),
+    ]
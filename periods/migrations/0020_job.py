@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 16:29
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+import django_enumfield.db.fields
+import periods.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('periods', '0019_flowevent_sync'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('key', models.CharField(blank=True, db_index=True, max_length=100)),
+                ('payload', models.TextField(default='{}')),
+                ('status', django_enumfield.db.fields.EnumField(default=0, enum=periods.models.JobStatus)),
+                ('attempts', models.IntegerField(default=0)),
+                ('max_attempts', models.IntegerField(default=3)),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='job',
+            index_together=set([('status', 'run_at')]),
+        ),
+    ]
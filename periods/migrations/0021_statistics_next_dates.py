@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 16:34
+from __future__ import unicode_literals
+
+import datetime
+
+from django.db import migrations, models
+
+
+def populate_next_dates(apps, schema_editor):
+    Statistics = apps.get_model('periods', 'Statistics')
+    Cycle = apps.get_model('periods', 'Cycle')
+    last_period_dates = {}
+    for user_id, start_date in Cycle.objects.order_by('user', 'index').values_list(
+            'user', 'start_date'):
+        last_period_dates[user_id] = start_date
+    for stats in Statistics.objects.exclude(user=None).select_related('user'):
+        if stats.user_id not in last_period_dates:
+            continue
+        stats.next_period_date = last_period_dates[stats.user_id] + datetime.timedelta(
+            days=stats.average_cycle_length)
+        stats.next_ovulation_date = stats.next_period_date - datetime.timedelta(
+            days=stats.user.luteal_phase_length)
+        stats.save(update_fields=['next_period_date', 'next_ovulation_date'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('periods', '0020_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='statistics',
+            name='next_ovulation_date',
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='statistics',
+            name='next_period_date',
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(populate_next_dates, migrations.RunPython.noop),
+    ]
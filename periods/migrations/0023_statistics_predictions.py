@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 16:50
+from __future__ import unicode_literals
+
+import datetime
+import json
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_predictions(apps, schema_editor):
+    Statistics = apps.get_model('periods', 'Statistics')
+    for stats in Statistics.objects.exclude(next_period_date=None).select_related('user'):
+        average_cycle = datetime.timedelta(days=stats.average_cycle_length)
+        luteal_phase = datetime.timedelta(days=stats.user.luteal_phase_length)
+        events = []
+        for i in range(1, settings.PREDICTION_HORIZON_CYCLES + 1):
+            period_date = stats.next_period_date + (i - 1) * average_cycle
+            events.append({'timestamp': (period_date - luteal_phase).isoformat(),
+                           'type': 'projected ovulation'})
+            events.append({'timestamp': period_date.isoformat(), 'type': 'projected period'})
+        stats.predictions = json.dumps(events)
+        stats.save(update_fields=['predictions'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('periods', '0022_notificationlog_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='statistics',
+            name='predictions',
+            field=models.TextField(default='[]'),
+        ),
+        migrations.RunPython(populate_predictions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 17:14
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('periods', '0023_statistics_predictions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='statistics',
+            name='data_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
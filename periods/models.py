@@ -1,14 +1,20 @@
 import datetime
+import json
 import pytz
 import statistics
+import threading
+import time
+import weakref
 
 from custom_user.models import AbstractEmailUser
 from django.conf import settings
 from django.contrib.auth.models import Group, Permission
 from django.contrib.postgres.fields import JSONField
 from django.core.cache import cache
-from django.db import models
-from django.db.models import signals
+from django.db import models, transaction
+from django.db.models import F, signals
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.utils.translation import ugettext_lazy as _
 from django_enumfield import enum
 
@@ -16,6 +22,8 @@ from rest_framework.authtoken.models import Token
 from timezone_field import TimeZoneField
 import requests
 
+from periods import caching
+
 
 def today():
     # Create helper method to allow mocking during tests
@@ -57,29 +65,57 @@ class User(AbstractEmailUser):
         next_periods = next_periods.order_by('timestamp')
         return next_periods.first()
 
+    def _get_cache_generation_key(self):
+        return 'user-%s-generation' % self.pk
+
+    def get_cache_generation(self):
+        key = self._get_cache_generation_key()
+        generation = cache.get(key)
+        if generation is None:
+            # Seed from the clock, so a generation lost to eviction never reuses an old value
+            cache.add(key, int(time.time() * 1000), None)
+            generation = cache.get(key)
+        return generation
+
     def get_cache_key(self, data_type):
-        return 'user-%s-%s' % (self.pk, data_type)
+        return 'user-%s-%s-%s' % (self.pk, self.get_cache_generation(), data_type)
+
+    def invalidate_cache(self):
+        # Bumping the generation orphans every cached value for this user, in all processes
+        try:
+            cache.incr(self._get_cache_generation_key())
+        except ValueError:
+            # No generation yet; the next read will seed a new one
+            pass
+
+    def completed_cycles(self):
+        return self.cycles.exclude(length=None).order_by('index')
+
+    @transaction.atomic
+    def rebuild_cycles(self):
+        # Fetch all start dates in a single query, then diff consecutive pairs in Python
+        _lock_user(self.pk)
+        first_days = [(pk, _get_start_date(timestamp)) for pk, timestamp in
+                      self.first_days().values_list('pk', 'timestamp')]
+        cycles = []
+        for index, (pk, start_date) in enumerate(first_days):
+            length = None
+            if index + 1 < len(first_days):
+                length = (first_days[index + 1][1] - start_date).days
+            cycles.append(Cycle(user=self, flow_event_id=pk, index=index, start_date=start_date,
+                                length=length))
+        self.cycles.all().delete()
+        Cycle.objects.bulk_create(cycles)
 
     def get_cycle_lengths(self):
-        key = self.get_cache_key('cycle_lengths')
-        cycle_lengths = cache.get(key)
-        if not cycle_lengths:
-            cycle_lengths = []
-            first_days = self.first_days()
-            if first_days.exists():
-                for i in range(1, self.cycle_count()):
-                    duration = first_days[i].timestamp.date() - first_days[i-1].timestamp.date()
-                    cycle_lengths.append(duration.days)
-            cache.set(key, cycle_lengths)
-        return cycle_lengths
+        return caching.get_or_compute(
+            self.get_cache_key('cycle_lengths'), 'cycle_lengths',
+            lambda: list(self.completed_cycles().values_list('length', flat=True)))
 
     def get_sorted_cycle_lengths(self):
-        key = self.get_cache_key('sorted_cycle_lengths')
-        sorted_cycle_lengths = cache.get(key)
-        if not sorted_cycle_lengths:
-            sorted_cycle_lengths = sorted(self.get_cycle_lengths())
-            cache.set(key, sorted_cycle_lengths)
-        return sorted_cycle_lengths
+        return caching.get_or_compute(
+            self.get_cache_key('sorted_cycle_lengths'), 'sorted_cycle_lengths',
+            lambda: sorted(self.get_cycle_lengths()))
 
     def get_full_name(self):
         full_name = '%s %s' % (self.first_name, self.last_name)
@@ -177,12 +213,110 @@ class FlowEvent(models.Model):
     clots = enum.EnumField(ClotSize, default=None, null=True, blank=True)
     cramps = enum.EnumField(CrampLevel, default=None, null=True, blank=True)
     comment = models.CharField(max_length=250, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # Most queries filter on user and order or range on timestamp. A partial index on
+        # (user, timestamp) WHERE first_day is added in migration 0018.
+        index_together = [('user', 'timestamp'), ('user', 'updated_at')]
 
     def __str__(self):
         return "%s %s (%s)" % (self.user.get_full_name(), FlowLevel.label(self.level),
                                self.timestamp)
 
 
+class DeletedFlowEvent(models.Model):
+    # Tombstone, so that sync clients can find out which events were deleted. No database
+    # constraint on user, as tombstones are written while a user's events are being deleted.
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='deleted_flow_events',
+                             db_constraint=False)
+    flow_event_id = models.IntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        index_together = [('user', 'deleted_at')]
+
+    def __str__(self):
+        return "%s deleted %s (%s)" % (self.user_id, self.flow_event_id, self.deleted_at)
+
+
+def get_tombstone_cutoff(now=None):
+    # Deletions before this time are no longer kept for sync clients
+    return (now or timezone.now()) - datetime.timedelta(days=settings.SYNC_RETENTION_DAYS)
+
+
+def _get_start_date(timestamp):
+    # Cycles start on the UTC date of the first day, matching what is stored in the database
+    if timezone.is_naive(timestamp):
+        timestamp = timezone.make_aware(timestamp, pytz.utc)
+    return timestamp.astimezone(pytz.utc).date()
+
+
+def _lock_user(user_id):
+    # Serialize changes to a user's cycles; the lock is held until the transaction ends
+    list(User.objects.select_for_update().filter(pk=user_id).values_list('pk', flat=True))
+
+
+class Cycle(models.Model):
+    # Denormalized cycle history: one row per first day, in timestamp order. length is the number
+    # of days until the next first day, and is null for the current (incomplete) cycle.
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='cycles')
+    flow_event = models.OneToOneField(FlowEvent, related_name='cycle')
+    index = models.IntegerField()
+    start_date = models.DateField()
+    length = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['user', 'index']
+        index_together = [('user', 'index')]
+
+    @classmethod
+    @transaction.atomic
+    def insert(cls, flow_event):
+        _lock_user(flow_event.user_id)
+        start_date = _get_start_date(flow_event.timestamp)
+        cycles = cls.objects.filter(user_id=flow_event.user_id)
+        index = cycles.filter(start_date__lte=start_date).count()
+        cycles.filter(index__gte=index).update(index=F('index') + 1)
+
+        next_cycle = cycles.filter(index=index + 1).first()
+        length = None
+        if next_cycle:
+            length = (next_cycle.start_date - start_date).days
+        cycle = cls.objects.create(user_id=flow_event.user_id, flow_event=flow_event, index=index,
+                                   start_date=start_date, length=length)
+
+        previous_cycle = cycles.filter(index=index - 1).first()
+        if previous_cycle:
+            previous_cycle.length = (start_date - previous_cycle.start_date).days
+            previous_cycle.save(update_fields=['length'])
+        return cycle
+
+    @transaction.atomic
+    def remove(self):
+        _lock_user(self.user_id)
+        # Re-read the index under the lock, as a concurrent change may have shifted it
+        cycles = Cycle.objects.filter(user_id=self.user_id)
+        index = cycles.filter(pk=self.pk).values_list('index', flat=True).first()
+        if index is None:
+            return
+        self.index = index
+        previous_cycle = cycles.filter(index=self.index - 1).first()
+        next_cycle = cycles.filter(index=self.index + 1).first()
+        self.delete()
+        cycles.filter(index__gt=self.index).update(index=F('index') - 1)
+
+        if previous_cycle:
+            previous_cycle.length = None
+            if next_cycle:
+                previous_cycle.length = (next_cycle.start_date - previous_cycle.start_date).days
+            previous_cycle.save(update_fields=['length'])
+
+    def __str__(self):
+        return "%s cycle %s (%s, %s days)" % (self.user.get_full_name(), self.index,
+                                              self.start_date, self.length)
+
+
 class Statistics(models.Model):
 
     class Meta:
@@ -191,6 +325,32 @@ class Statistics(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, related_name='statistics', null=True)
     average_cycle_length = models.IntegerField(default=28)
     all_time_average_cycle_length = models.IntegerField(default=28)
+    # Next expected dates, projected from the most recent period, so that users who are due a
+    # notification can be selected in the database
+    next_period_date = models.DateField(null=True, blank=True, db_index=True)
+    next_ovulation_date = models.DateField(null=True, blank=True, db_index=True)
+    # JSON list of projected ovulation and period dates for PREDICTION_HORIZON_CYCLES cycles,
+    # refreshed whenever statistics are recomputed
+    predictions = models.TextField(default='[]')
+    # Incremented whenever the user's flow events change; used to validate cached API responses
+    data_version = models.PositiveIntegerField(default=0)
+
+    def set_predictions(self, last_period_date):
+        events = []
+        self.next_period_date = None
+        self.next_ovulation_date = None
+        if last_period_date:
+            luteal_phase = datetime.timedelta(days=self.user.luteal_phase_length)
+            self.next_period_date = last_period_date + datetime.timedelta(
+                days=self.average_cycle_length)
+            self.next_ovulation_date = self.next_period_date - luteal_phase
+            for i in range(1, settings.PREDICTION_HORIZON_CYCLES + 1):
+                period_date = last_period_date + datetime.timedelta(
+                    days=i*self.average_cycle_length)
+                events.append({'timestamp': (period_date - luteal_phase).isoformat(),
+                               'type': 'projected ovulation'})
+                events.append({'timestamp': period_date.isoformat(), 'type': 'projected period'})
+        self.predictions = json.dumps(events)
 
     def _get_ordinal_value(self, index):
         value = None
@@ -273,18 +433,8 @@ class Statistics(models.Model):
 
     @property
     def predicted_events(self):
-        events = []
-        today_date = today()
-        previous_period = self.user.get_previous_period(previous_to=today_date)
-        if previous_period:
-            for i in range(1, 4):
-                ovulation_date = (previous_period.timestamp + datetime.timedelta(
-                    days=i*self.average_cycle_length - self.user.luteal_phase_length)).date()
-                events.append({'timestamp': ovulation_date, 'type': 'projected ovulation'})
-                period_date = (previous_period.timestamp + datetime.timedelta(
-                    days=i*self.average_cycle_length)).date()
-                events.append({'timestamp': period_date, 'type': 'projected period'})
-        return events
+        return [{'timestamp': parse_date(event['timestamp']), 'type': event['type']}
+                for event in json.loads(self.predictions)]
 
     def __str__(self):
         return "%s (%s)" % (self.user.get_full_name(), self.user.email)
@@ -313,16 +463,114 @@ class AerisData(models.Model):
         return result
 
     @classmethod
-    def get_for_date(cls, from_date, to_date):
-        existing = cls.objects.filter(to_date=to_date)
-        if existing.count() > 0:
-            data = existing[0].data
+    def get_for_date(cls, from_date, to_date, prefetch_next=True):
+        existing = cls.objects.filter(to_date=to_date).first()
+        if existing:
+            data = existing.data
         else:
             data = cls.get_from_server(from_date)
             if data and not data['error']:
                 cls.objects.create(to_date=to_date, data=data)
+                if prefetch_next:
+                    # The fetch and save succeeded, so both dates are valid
+                    to_python = cls._meta.get_field('to_date').to_python
+                    cls.prefetch_next(to_python(from_date), to_python(to_date))
         return data
 
+    @classmethod
+    def prefetch_next(cls, from_date, to_date):
+        # Users usually page forward next, so fetch the following range (given dates) in the
+        # background, unless it is already stored or being fetched
+        next_to_date = to_date + (to_date - from_date)
+        if cls.objects.filter(to_date=next_to_date).exists():
+            return None
+        key = next_to_date.strftime(settings.API_DATE_FORMAT)
+        pending = Job.objects.filter(name='prefetch_moon_phases', key=key,
+                                     status__in=[JobStatus.QUEUED, JobStatus.RUNNING])
+        if pending.exists():
+            return None
+        return Job.enqueue('prefetch_moon_phases', key=key,
+                           from_date=to_date.strftime(settings.API_DATE_FORMAT), to_date=key)
+
+
+class JobStatus(LabelChoicesEnum):
+    QUEUED = 0
+    RUNNING = 1
+    DONE = 2
+    FAILED = 3
+
+    __labels__ = {
+        QUEUED: _("Queued"),
+        RUNNING: _("Running"),
+        DONE: _("Done"),
+        FAILED: _("Failed"),
+    }
+
+
+class Job(models.Model):
+    # Background job, processed by the run_jobs management command. Tasks are registered by name
+    # in periods.jobs; payload holds the JSON-encoded keyword arguments for the task.
+    name = models.CharField(max_length=100)
+    key = models.CharField(max_length=100, blank=True, db_index=True)
+    payload = models.TextField(default='{}')
+    status = enum.EnumField(JobStatus, default=JobStatus.QUEUED)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    run_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        index_together = [('status', 'run_at')]
+
+    @classmethod
+    def enqueue(cls, name, key='', delay=0, max_attempts=3, **kwargs):
+        # If key is given and a job with that key is still queued, it is reused, so repeated
+        # requests for the same work collapse into one job
+        if key:
+            existing = cls.objects.filter(name=name, key=key, status=JobStatus.QUEUED).first()
+            if existing:
+                return existing
+        return cls.objects.create(name=name, key=key, payload=json.dumps(kwargs),
+                                  max_attempts=max_attempts,
+                                  run_at=timezone.now() + datetime.timedelta(seconds=delay))
+
+    @property
+    def kwargs(self):
+        return json.loads(self.payload)
+
+    def __str__(self):
+        return "%s %s (%s)" % (self.name, self.key, JobStatus.label(self.status))
+
+
+class NotificationLog(models.Model):
+    # Ledger of notification emails sent, so that a notification is never sent twice
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='notification_logs')
+    notification_type = models.CharField(max_length=50)
+    expected_date = models.DateField()
+    sent_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user', 'notification_type', 'expected_date')
+
+    def __str__(self):
+        return "%s %s (%s)" % (self.user.email, self.notification_type, self.expected_date)
+
+
+class Checkpoint(models.Model):
+    # Progress through a long-running command, so that an interrupted run can resume
+    name = models.CharField(max_length=100)
+    run_date = models.DateField()
+    last_id = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('name', 'run_date')
+
+    def __str__(self):
+        return "%s %s (%s)" % (self.name, self.run_date, self.last_id)
+
 
 def create_auth_token(sender, instance=None, created=False, **kwargs):
     if created:
@@ -346,17 +594,138 @@ def create_statistics(sender, instance, **kwargs):
         stats.save()
 
 
-def update_statistics(sender, instance, **kwargs):
+def update_predictions(sender, instance, created=False, update_fields=None, **kwargs):
+    # Projected ovulation dates depend on the luteal phase length, which may have changed
+    if created or (update_fields and 'luteal_phase_length' not in update_fields):
+        return
+    stats = Statistics.objects.filter(user=instance).exclude(next_period_date=None).first()
+    if stats:
+        stats.user = instance
+        next_ovulation_date = stats.next_ovulation_date
+        stats.set_predictions(stats.next_period_date - datetime.timedelta(
+            days=stats.average_cycle_length))
+        if stats.next_ovulation_date != next_ovulation_date:
+            stats.save(update_fields=['next_period_date', 'next_ovulation_date', 'predictions'])
+
+
+_batches = threading.local()
+
+
+def _get_batch(user_id):
+    return getattr(_batches, 'by_user', {}).get(user_id)
+
+
+class FlowEventBatch(object):
+    """
+    Context manager for writing many of a user's FlowEvents at once. Per-event signal handling is
+    suspended inside the block; cycles and statistics are rebuilt once, and tombstones for deleted
+    events are written in bulk, when the block exits without error.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.deleted_ids = []
+        self.outer = None
+
+    def __enter__(self):
+        if not hasattr(_batches, 'by_user'):
+            _batches.by_user = {}
+        self.outer = _batches.by_user.get(self.user.pk)
+        if not self.outer:
+            _batches.by_user[self.user.pk] = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.outer:
+            # Nested batch for the same user; the outermost one does the work
+            return
+        del _batches.by_user[self.user.pk]
+        if exc_type is None:
+            DeletedFlowEvent.objects.bulk_create(
+                [DeletedFlowEvent(user=self.user, flow_event_id=pk) for pk in self.deleted_ids])
+            self.user.rebuild_cycles()
+            recompute_statistics(self.user)
+
+
+@transaction.atomic
+def update_cycles(sender, instance, **kwargs):
+    # Only the cycle for this event and its neighbours are touched
+    if not instance.user_id or _get_batch(instance.user_id):
+        return
+    _lock_user(instance.user_id)
+    cycle = Cycle.objects.filter(flow_event_id=instance.pk).first()
+    if cycle:
+        unchanged = (instance.first_day and cycle.user_id == instance.user_id and
+                     cycle.start_date == _get_start_date(instance.timestamp))
+        if unchanged:
+            return
+        cycle.remove()
+    if instance.first_day:
+        Cycle.insert(instance)
+
+
+# Ids of the flow events being deleted along with their user in this thread, by user id. They
+# need no cycle, statistics or tombstone updates, as those rows are deleted with the user. The
+# user may be deleted before or after its events, so each id is dropped once its event is done.
+_deleting_users = threading.local()
+
+
+def _is_deleted_with_user(flow_event):
+    return flow_event.pk in getattr(_deleting_users, 'by_user', {}).get(flow_event.user_id, ())
+
+
+def start_user_delete(sender, instance, **kwargs):
+    flow_event_ids = set(FlowEvent.objects.filter(user_id=instance.pk).values_list(
+        'pk', flat=True))
+    if flow_event_ids:
+        if not hasattr(_deleting_users, 'by_user'):
+            _deleting_users.by_user = {}
+        _deleting_users.by_user[instance.pk] = flow_event_ids
+
+
+def end_user_delete(sender, instance, **kwargs):
+    # Tombstones have no database constraint to cascade the delete
+    DeletedFlowEvent.objects.filter(user_id=instance.pk).delete()
+
+
+def end_flow_event_delete(sender, instance, **kwargs):
+    flow_event_ids = getattr(_deleting_users, 'by_user', {}).get(instance.user_id)
+    if flow_event_ids:
+        flow_event_ids.discard(instance.pk)
+        if not flow_event_ids:
+            del _deleting_users.by_user[instance.user_id]
+
+
+@transaction.atomic
+def remove_cycle(sender, instance, **kwargs):
+    if _get_batch(instance.user_id) or _is_deleted_with_user(instance):
+        return
+    _lock_user(instance.user_id)
+    cycle = Cycle.objects.filter(flow_event_id=instance.pk).first()
+    if cycle:
+        cycle.remove()
+
+
+def record_deleted_flow_event(sender, instance, **kwargs):
+    if not instance.user_id or _is_deleted_with_user(instance):
+        return
+    batch = _get_batch(instance.user_id)
+    if batch:
+        batch.deleted_ids.append(instance.pk)
+    else:
+        DeletedFlowEvent.objects.create(user_id=instance.user_id, flow_event_id=instance.pk)
+
+
+def recompute_statistics(user):
     try:
-        stats = Statistics.objects.get(user=instance.user)
-    except (Statistics.DoesNotExist, User.DoesNotExist):
+        stats = Statistics.objects.get(user=user)
+    except Statistics.DoesNotExist:
         # There may not be statistics, for example when deleting a user
         return
 
-    cache.delete(instance.user.get_cache_key('cycle_lengths'))
-    cache.delete(instance.user.get_cache_key('sorted_cycle_lengths'))
+    user.invalidate_cache()
 
-    cycle_lengths = instance.user.get_cycle_lengths()
+    cycle_lengths = user.get_cycle_lengths()
     # Calculate average (if possible) and update statistics object
     if len(cycle_lengths) > 0:
         recent_cycle_lengths = cycle_lengths[-6:]
@@ -364,12 +733,78 @@ def update_statistics(sender, instance, **kwargs):
         stats.average_cycle_length = int(round(avg))
         avg = sum(cycle_lengths) / len(cycle_lengths)
         stats.all_time_average_cycle_length = int(round(avg))
+    stats.set_predictions(user.cycles.order_by('-index').values_list(
+        'start_date', flat=True).first())
+    stats.data_version = F('data_version') + 1
     stats.save()
 
 
+# Pending on_commit recomputes in this thread, by user id. Values are weak references, so a
+# callback that Django discards when its transaction is rolled back also drops out of here.
+_scheduled_statistics = threading.local()
+
+
+def _get_scheduled_statistics():
+    if not hasattr(_scheduled_statistics, 'by_user'):
+        _scheduled_statistics.by_user = weakref.WeakValueDictionary()
+    return _scheduled_statistics.by_user
+
+
+class _RecomputeStatistics(object):
+    # on_commit callback, registered once per user and transaction
+    def __init__(self, user):
+        self.user = user
+
+    def __call__(self):
+        _get_scheduled_statistics().pop(self.user.pk, None)
+        recompute_statistics(self.user)
+
+
+def _schedule_statistics(user):
+    if not transaction.get_connection().in_atomic_block:
+        recompute_statistics(user)
+        return
+    scheduled = _get_scheduled_statistics()
+    if user.pk not in scheduled:
+        callback = scheduled[user.pk] = _RecomputeStatistics(user)
+        transaction.on_commit(callback)
+
+
+def update_statistics(sender, instance, **kwargs):
+    if _get_batch(instance.user_id) or _is_deleted_with_user(instance):
+        return
+    try:
+        user = instance.user
+    except User.DoesNotExist:
+        return
+    if (settings.STATISTICS_UPDATE_MODE == 'on_commit' and
+            user.pk in _get_scheduled_statistics()):
+        # Already handled earlier in this transaction; the recompute bumps the version anyway
+        return
+    if settings.STATISTICS_UPDATE_MODE != 'immediate':
+        # Statistics catch up later, but cached data and responses must not outlive the change
+        user.invalidate_cache()
+        Statistics.objects.filter(user=user).update(data_version=F('data_version') + 1)
+    if settings.STATISTICS_UPDATE_MODE == 'on_commit':
+        _schedule_statistics(user)
+    elif settings.STATISTICS_UPDATE_MODE == 'queue':
+        Job.enqueue('update_statistics', key='user-%s' % user.pk,
+                    delay=settings.STATISTICS_UPDATE_DELAY, user_id=user.pk)
+    else:
+        recompute_statistics(user)
+
+
 signals.post_save.connect(create_auth_token, sender=settings.AUTH_USER_MODEL)
 signals.post_save.connect(add_to_permissions_group, sender=settings.AUTH_USER_MODEL)
 signals.post_save.connect(create_statistics, sender=settings.AUTH_USER_MODEL)
+signals.post_save.connect(update_predictions, sender=settings.AUTH_USER_MODEL)
+signals.pre_delete.connect(start_user_delete, sender=settings.AUTH_USER_MODEL)
+signals.post_delete.connect(end_user_delete, sender=settings.AUTH_USER_MODEL)
 
+signals.post_save.connect(update_cycles, sender=FlowEvent)
+signals.pre_delete.connect(remove_cycle, sender=FlowEvent)
 signals.post_save.connect(update_statistics, sender=FlowEvent)
+signals.post_delete.connect(record_deleted_flow_event, sender=FlowEvent)
 signals.post_delete.connect(update_statistics, sender=FlowEvent)
+# Last, after the other handlers have checked _is_deleted_with_user
+signals.post_delete.connect(end_flow_event_delete, sender=FlowEvent)
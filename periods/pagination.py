@@ -0,0 +1,89 @@
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.six.moves.urllib import parse as urlparse
+from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class TimestampKeysetPagination(pagination.BasePagination):
+    """
+    Keyset pagination on (timestamp, id), so each page is an index range scan rather than an
+    OFFSET scan. Pagination is only applied when the client passes cursor or page_size, so
+    existing clients still receive a plain list.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 100
+    max_page_size = 1000
+    invalid_cursor_message = 'Invalid cursor'
+
+    def is_requested(self, request):
+        return (self.cursor_query_param in request.query_params or
+                self.page_size_query_param in request.query_params)
+
+    def get_page_size(self, request):
+        # A positive integer, up to max_page_size; anything else gets the default
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            tokens = urlparse.parse_qs(b64decode(encoded.encode('ascii')).decode('ascii'))
+            timestamp = parse_datetime(tokens['t'][0])
+            pk = int(tokens['i'][0])
+        except (TypeError, ValueError, KeyError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not timestamp:
+            raise NotFound(self.invalid_cursor_message)
+        return timestamp, pk
+
+    def encode_cursor(self, position):
+        timestamp, pk = position
+        querystring = urlparse.urlencode({'t': timestamp.isoformat(), 'i': pk})
+        encoded = b64encode(querystring.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_requested(request):
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by('timestamp', 'id')
+        position = self.decode_cursor(request)
+        if position:
+            timestamp, pk = position
+            queryset = queryset.filter(Q(timestamp__gt=timestamp) | Q(timestamp=timestamp,
+                                                                      id__gt=pk))
+
+        # Fetch one extra row to find out whether there is a next page
+        results = list(queryset[:page_size + 1])
+        self.next_position = None
+        if len(results) > page_size:
+            results = results[:page_size]
+            self.next_position = (results[-1].timestamp, results[-1].pk)
+        return results
+
+    def get_next_link(self):
+        if not self.next_position:
+            return None
+        return self.encode_cursor(self.next_position)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
@@ -25,7 +25,7 @@ class FlowEventSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = period_models.FlowEvent
-        exclude = ('user',)
+        exclude = ('user', 'updated_at')
 
 
 class FlowEventFilter(django_filters.FilterSet):
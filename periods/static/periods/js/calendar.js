@@ -201,7 +201,7 @@ var makeMoonPhaseEvents = function(responseData, moment, timezone) {
     return events;
 };
 
-var initializeCalendar = function(periodsUrl, statisticsUrl, flowEventUrl, aerisUrl, timezone) {
+var initializeCalendar = function(calendarDataUrl, periodsUrl, flowEventUrl, timezone) {
     $('#id_calendar').fullCalendar({
         timezone: timezone,
         defaultDate: getDefaultDate(moment, window.location.search),
@@ -218,28 +218,23 @@ var initializeCalendar = function(periodsUrl, statisticsUrl, flowEventUrl, aeris
                 min_timestamp: startDate,
                 max_timestamp: endDate
             };
-            $.getJSON(periodsUrl, data, function(periodData) {
+            $.getJSON(calendarDataUrl, data, function(calendarData) {
                 var newUrl = window.location.protocol + "//" + window.location.host +
                     window.location.pathname + "?start=" + startDate + "&end=" + endDate;
                 window.history.pushState({path: newUrl}, '', newUrl);
-                $.getJSON(statisticsUrl, {min_timestamp: startDate}, function(statisticsData) {
-                    var events = makeEvents(moment, timezone, periodData.concat(statisticsData.predicted_events));
-                    addDayCounts(events.periodStartDates, moment(statisticsData.first_date),
-                        statisticsData.first_day);
-                    // TODO Fetch and add these events later, after calendar has rendered
-                    $.getJSON(aerisUrl, data, function(aerisData) {
-                        if (aerisData.error) {
-                            console.log('aeris: ' + JSON.stringify(aerisData.error));
-                        } else {
-                            if (aerisData.phasedata) {
-                                var moonPhaseEvents = makeMoonPhaseEvents(aerisData.phasedata, moment, timezone);
-                                console.log('moonPhaseEvents', moonPhaseEvents);
-                                events.events = events.events.concat(moonPhaseEvents);
-                            }
-                        }
-                        callback(events.events);
-                    });
-                });
+                var statisticsData = calendarData.statistics;
+                var events = makeEvents(moment, timezone,
+                    calendarData.events.concat(statisticsData.predicted_events));
+                addDayCounts(events.periodStartDates, moment(statisticsData.first_date),
+                    statisticsData.first_day);
+                var moonPhaseData = calendarData.moon_phases;
+                if (moonPhaseData.error) {
+                    console.log('aeris: ' + JSON.stringify(moonPhaseData.error));
+                } else if (moonPhaseData.phasedata) {
+                    var moonPhaseEvents = makeMoonPhaseEvents(moonPhaseData.phasedata, moment, timezone);
+                    events.events = events.events.concat(moonPhaseEvents);
+                }
+                callback(events.events);
             });
         },
         dayClick: function(date, jsEvent, view) {
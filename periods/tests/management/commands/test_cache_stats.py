@@ -0,0 +1,30 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils.six import StringIO
+
+from periods import caching
+from periods.management.commands import cache_stats
+
+
+class TestCommand(TestCase):
+    def setUp(self):
+        cache.clear()
+        caching.reset_stats()
+        self.stdout = StringIO()
+        self.command = cache_stats.Command(stdout=self.stdout)
+        caching.get_or_compute('key', 'cycle_lengths', lambda: [28])
+        caching.get_or_compute('key', 'cycle_lengths', lambda: [28])
+
+    def test_cache_stats(self):
+        self.command.handle()
+
+        output = self.stdout.getvalue()
+        self.assertIn('cycle_lengths', output)
+        self.assertIn('0.5', output)
+        self.assertEqual(1, caching.get_stats()['cycle_lengths']['hits'])
+
+    def test_cache_stats_reset(self):
+        self.command.handle(reset=True)
+
+        self.assertIn('Counters reset', self.stdout.getvalue())
+        self.assertEqual(0, caching.get_stats()['cycle_lengths']['hits'])
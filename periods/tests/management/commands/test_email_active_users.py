@@ -1,5 +1,6 @@
 import datetime
 import pytz
+from io import StringIO
 
 from django.test import TestCase
 from mock import patch
@@ -7,17 +8,19 @@ from mock import patch
 from periods import models as period_models
 from periods.management.commands import email_active_users
 from periods.tests.factories import FlowEventFactory
+from periods.tests.query_counts import QueryCountTestMixin
 
 TIMEZONE = pytz.timezone("US/Eastern")
 
 
-class TestCommand(TestCase):
+class TestCommand(QueryCountTestMixin, TestCase):
     def setUp(self):
         self.command = email_active_users.Command()
         flow_event = FlowEventFactory()
         self.user = flow_event.user
         FlowEventFactory(user=self.user,
                          timestamp=TIMEZONE.localize(datetime.datetime(2014, 2, 28)))
+        self.command.stdout = StringIO()
 
     @patch('django.core.mail.EmailMultiAlternatives.send')
     def test_email_active_users_no_periods(self, mock_send):
@@ -38,9 +41,9 @@ class TestCommand(TestCase):
 
         self.assertFalse(mock_send.called)
 
-    @patch('periods.email_sender.send')
+    @patch('periods.email_sender.send_batch', return_value=(1, []))
     @patch('periods.models.today')
-    def test_email_active_users(self, mock_today, mock_send):
+    def test_email_active_users(self, mock_today, mock_send_batch):
         mock_today.return_value = TIMEZONE.localize(datetime.datetime(2014, 3, 15))
 
         self.command.handle()
@@ -58,5 +61,70 @@ class TestCommand(TestCase):
                       'as if it is in Eastern time. This will likely\nresult in a time shift when '
                       'you view your events. If desired, you can then edit events yourself.\n\nI '
                       'apologize for the inconvenience.\n\nSincerely,\n\n')
-        mock_send.assert_called_once_with(self.user, 'Important information about the data in your '
-                                                     'eggtimer account', email_text, None)
+        mock_send_batch.assert_called_once_with(
+            [(self.user, 'Important information about the data in your eggtimer account',
+              email_text, None)], None)
+        self.assertEqual('Sent 1 emails, 0 failed', self.command.stdout.getvalue())
+
+    def _get_users(self, mock_send_batch):
+        return [item[0] for item in mock_send_batch.call_args[0][0]]
+
+    @patch('periods.email_sender.send_batch', return_value=(1, []))
+    @patch('periods.models.today')
+    def test_email_active_users_inactive(self, mock_today, mock_send_batch):
+        # 90 days since the last period
+        mock_today.return_value = TIMEZONE.localize(datetime.datetime(2014, 5, 29))
+
+        self.command.handle()
+
+        self.assertEqual([], self._get_users(mock_send_batch))
+
+    @patch('periods.email_sender.send_batch', return_value=(1, []))
+    @patch('periods.models.today')
+    def test_email_active_users_recently_active(self, mock_today, mock_send_batch):
+        mock_today.return_value = TIMEZONE.localize(datetime.datetime(2014, 5, 28))
+
+        self.command.handle()
+
+        self.assertEqual([self.user], self._get_users(mock_send_batch))
+
+    @patch('periods.email_sender.send_batch', return_value=(1, []))
+    @patch('periods.models.today')
+    def test_email_active_users_no_previous_period(self, mock_today, mock_send_batch):
+        mock_today.return_value = TIMEZONE.localize(datetime.datetime(2014, 1, 15))
+        user = FlowEventFactory(first_day=False).user
+
+        self.command.handle()
+
+        self.assertEqual([self.user, user], self._get_users(mock_send_batch))
+
+    @patch('builtins.print')
+    @patch('builtins.input', return_value='no')
+    @patch('periods.models.today')
+    def test_email_active_users_dry_run(self, mock_today, mock_input, mock_print):
+        mock_today.return_value = TIMEZONE.localize(datetime.datetime(2014, 3, 15))
+
+        self.command.handle(interactive=True)
+
+        mock_print.assert_called_with('%35s %5s periods' % (self.user.email, 2))
+
+    def _add_users(self, num_users):
+        for i in range(num_users):
+            FlowEventFactory(timestamp=TIMEZONE.localize(datetime.datetime(2014, 3, 1)))
+
+    @patch('periods.email_sender.send_batch', return_value=(1, []))
+    @patch('periods.models.today')
+    def test_email_active_users_query_count(self, mock_today, mock_send_batch):
+        mock_today.return_value = TIMEZONE.localize(datetime.datetime(2014, 3, 15))
+
+        self.assertQueriesPerUser(0, lambda: self.command.handle(interactive=False),
+                                  self._add_users)
+
+    @patch('builtins.print')
+    @patch('builtins.input', return_value='no')
+    @patch('periods.models.today')
+    def test_email_active_users_dry_run_query_count(self, mock_today, mock_input, mock_print):
+        mock_today.return_value = TIMEZONE.localize(datetime.datetime(2014, 3, 15))
+
+        self.assertQueriesPerUser(0, lambda: self.command.handle(interactive=True),
+                                  self._add_users)
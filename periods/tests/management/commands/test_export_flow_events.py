@@ -0,0 +1,45 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.test import TestCase
+
+from periods.management.commands import export_flow_events
+from periods.tests.factories import FlowEventFactory
+
+
+class TestCommand(TestCase):
+
+    def setUp(self):
+        self.command = export_flow_events.Command()
+        self.command.stdout = StringIO()
+        self.period = FlowEventFactory()
+        FlowEventFactory()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.output = os.path.join(self.directory, 'export.gz')
+
+    def test_export_csv(self):
+        self.command.handle(output=self.output)
+
+        with gzip.open(self.output, 'rt', encoding='utf-8') as export_file:
+            lines = export_file.read().splitlines()
+        self.assertEqual('user,id,timestamp,first_day,level,color,clots,cramps,comment', lines[0])
+        self.assertEqual('%s,%s,2014-01-31T17:00:00+00:00,True,2,2,,,' % (
+            self.period.user.id, self.period.id), lines[1])
+        self.assertEqual(3, len(lines))
+        self.assertEqual('Exported 2 flow events to %s' % self.output,
+                         self.command.stdout.getvalue())
+
+    def test_export_ndjson(self):
+        self.command.handle(output=self.output, export_format='ndjson', batch_size=1)
+
+        with gzip.open(self.output, 'rt', encoding='utf-8') as export_file:
+            rows = [json.loads(line) for line in export_file]
+        self.assertEqual(2, len(rows))
+        self.assertEqual(self.period.user.id, rows[0]['user'])
+        self.assertEqual('Exported 2 flow events to %s' % self.output,
+                         self.command.stdout.getvalue())
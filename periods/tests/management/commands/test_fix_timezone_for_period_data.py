@@ -1,7 +1,9 @@
 import datetime
 import pytz
+from io import StringIO
 
 from django.test import TestCase
+from mock import patch
 
 from periods import models as period_models
 from periods.management.commands import fix_timezone_for_period_data
@@ -18,6 +20,7 @@ class TestCommand(TestCase):
         self.user = flow_event.user
         FlowEventFactory(user=self.user,
                          timestamp=TIMEZONE.localize(datetime.datetime(2014, 8, 28)))
+        self.command.stdout = StringIO()
 
     def test_fix_timezone_for_period_data_no_periods(self):
         period_models.FlowEvent.objects.all().delete()
@@ -34,3 +37,39 @@ class TestCommand(TestCase):
         self.assertEqual(pytz.utc.localize(datetime.datetime(2014, 1, 31, 22)),
                          periods[0].timestamp)
         self.assertEqual(pytz.utc.localize(datetime.datetime(2014, 8, 28, 4)), periods[1].timestamp)
+
+    @patch('periods.models.recompute_statistics')
+    def test_fix_timezone_for_period_data_statistics_once_per_user(self, mock_recompute):
+        self.command.handle()
+
+        mock_recompute.assert_called_once_with(self.user)
+
+    def test_fix_timezone_for_period_data_batches(self):
+        FlowEventFactory(user=self.user,
+                         timestamp=TIMEZONE.localize(datetime.datetime(2014, 9, 28)))
+
+        with patch('periods.helpers.bulk_update') as mock_bulk_update:
+            self.command.handle(batch_size=2)
+
+        self.assertEqual([2, 1], [len(call[0][0]) for call in mock_bulk_update.call_args_list])
+        output = self.command.stdout.getvalue()
+        self.assertIn('Processed 2/3 flow events', output)
+        self.assertIn('Processed 3/3 flow events', output)
+        self.assertIn('Updated 3 flow events for 1 users', output)
+
+    @patch('periods.models.FlowEvent.save')
+    def test_fix_timezone_for_period_data_no_per_event_saves(self, mock_save):
+        self.command.handle()
+
+        self.assertFalse(mock_save.called)
+        self.assertEqual(2, period_models.Cycle.objects.filter(user=self.user).count())
+
+    @patch('periods.models.recompute_statistics')
+    @patch('periods.helpers.bulk_update')
+    def test_fix_timezone_for_period_data_dry_run(self, mock_bulk_update, mock_recompute):
+        self.command.handle(dry_run=True)
+
+        self.assertFalse(mock_bulk_update.called)
+        self.assertFalse(mock_recompute.called)
+        self.assertIn('2014-01-31 22:00:00+00:00 -> 2014-01-31 22:00:00+00:00',
+                      self.command.stdout.getvalue())
@@ -1,16 +1,20 @@
+import argparse
 import datetime
 import pytz
+from io import StringIO
 
 from django.conf import settings
+from django.core import mail
 from django.test import TestCase
 from mock import ANY, patch
 
 from periods import models as period_models
 from periods.management.commands import notify_upcoming_period
 from periods.tests.factories import FlowEventFactory
+from periods.tests.query_counts import QueryCountTestMixin
 
 
-class TestCommand(TestCase):
+class TestCommand(QueryCountTestMixin, TestCase):
     EMAIL_FOOTER = ('Check your calendar: http://example.com/calendar/\nFound a bug? Have a '
                     'feature request? Please let us know: https://github.com/jessamynsmith/'
                     'eggtimer-server/issues\nDisable email notifications: '
@@ -22,6 +26,11 @@ class TestCommand(TestCase):
         self.user = flow_event.user
         FlowEventFactory(user=self.user,
                          timestamp=pytz.utc.localize(datetime.datetime(2014, 2, 28)))
+        self.command.stdout = StringIO()
+
+    def _get_emails(self, mock_send_batch):
+        mock_send_batch.assert_called_once_with(ANY, None, on_sent=ANY)
+        return list(mock_send_batch.call_args[0][0])
 
     @patch('django.core.mail.EmailMultiAlternatives.send')
     def test_notify_upcoming_period_no_periods(self, mock_send):
@@ -42,27 +51,27 @@ class TestCommand(TestCase):
 
         self.assertFalse(mock_send.called)
 
-    @patch('periods.email_sender.send')
+    @patch('periods.email_sender.send_batch', return_value=(1, []))
     @patch('periods.models.today')
-    def test_notify_upcoming_period_no_events(self, mock_today, mock_send):
+    def test_notify_upcoming_period_no_events(self, mock_today, mock_send_batch):
         mock_today.return_value = pytz.utc.localize(datetime.datetime(2014, 3, 13))
 
         self.command.handle()
 
-        self.assertFalse(mock_send.called)
+        self.assertFalse(mock_send_batch.called)
 
-    @patch('periods.email_sender.send')
+    @patch('periods.email_sender.send_batch', return_value=(1, []))
     @patch('periods.models.today')
-    def test_notify_upcoming_period_all_events_in_future(self, mock_today, mock_send):
+    def test_notify_upcoming_period_all_events_in_future(self, mock_today, mock_send_batch):
         mock_today.return_value = pytz.utc.localize(datetime.datetime(2014, 1, 15))
 
         self.command.handle()
 
-        self.assertFalse(mock_send.called)
+        self.assertFalse(mock_send_batch.called)
 
-    @patch('periods.email_sender.send')
+    @patch('periods.email_sender.send_batch', return_value=(1, []))
     @patch('periods.models.today')
-    def test_notify_upcoming_period_ovulation(self, mock_today, mock_send):
+    def test_notify_upcoming_period_ovulation(self, mock_today, mock_send_batch):
         mock_today.return_value = pytz.utc.localize(datetime.datetime(2014, 3, 14))
 
         self.command.handle()
@@ -70,11 +79,12 @@ class TestCommand(TestCase):
         email_text = ('Hello Jessamyn,\n\nYou are probably ovulating today, '
                       'Friday March 14, 2014!\n\nCheers!\n%s\n\n%s' %
                       (settings.ADMINS[0][0], self.EMAIL_FOOTER))
-        mock_send.assert_called_once_with(self.user, 'Ovulation today!', email_text, ANY)
+        self.assertEqual([(self.user, 'Ovulation today!', email_text, ANY)],
+                         self._get_emails(mock_send_batch))
 
-    @patch('periods.email_sender.send')
+    @patch('periods.email_sender.send_batch', return_value=(1, []))
     @patch('periods.models.today')
-    def test_notify_upcoming_period_expected_soon(self, mock_today, mock_send):
+    def test_notify_upcoming_period_expected_soon(self, mock_today, mock_send_batch):
         mock_today.return_value = pytz.utc.localize(datetime.datetime(2014, 3, 25))
 
         self.command.handle()
@@ -82,11 +92,12 @@ class TestCommand(TestCase):
         email_text = ('Hello Jessamyn,\n\nYou should be getting your period in 3 days, on Friday '
                       'March 28, 2014.\n\nCheers!\n%s\n\n%s' %
                       (settings.ADMINS[0][0], self.EMAIL_FOOTER))
-        mock_send.assert_called_once_with(self.user, 'Period starting', email_text, ANY)
+        self.assertEqual([(self.user, 'Period starting', email_text, ANY)],
+                         self._get_emails(mock_send_batch))
 
-    @patch('periods.email_sender.send')
+    @patch('periods.email_sender.send_batch', return_value=(1, []))
     @patch('periods.models.today')
-    def test_notify_upcoming_period_expected_today(self, mock_today, mock_send):
+    def test_notify_upcoming_period_expected_today(self, mock_today, mock_send_batch):
         mock_today.return_value = pytz.utc.localize(datetime.datetime(2014, 3, 28))
 
         self.command.handle()
@@ -94,11 +105,12 @@ class TestCommand(TestCase):
         email_text = ('Hello Jessamyn,\n\nYou should be getting your period today, Friday March '
                       '28, 2014!\n\nCheers!\n%s\n\n%s' %
                       (settings.ADMINS[0][0], self.EMAIL_FOOTER))
-        mock_send.assert_called_once_with(self.user, 'Period today!', email_text, ANY)
+        self.assertEqual([(self.user, 'Period today!', email_text, ANY)],
+                         self._get_emails(mock_send_batch))
 
-    @patch('periods.email_sender.send')
+    @patch('periods.email_sender.send_batch', return_value=(1, []))
     @patch('periods.models.today')
-    def test_notify_upcoming_period_overdue(self, mock_today, mock_send):
+    def test_notify_upcoming_period_overdue(self, mock_today, mock_send_batch):
         mock_today.return_value = pytz.utc.localize(datetime.datetime(2014, 3, 29))
 
         self.command.handle()
@@ -107,5 +119,217 @@ class TestCommand(TestCase):
                       'Friday March 28, 2014.\nDid you forget to add your last period?\n\n'
                       'Cheers!\n%s\n\n%s' %
                       (settings.ADMINS[0][0], self.EMAIL_FOOTER))
-        mock_send.assert_called_once_with(self.user, 'Period was expected 1 day ago',
-                                          email_text, ANY)
+        self.assertEqual([(self.user, 'Period was expected 1 day ago', email_text, ANY)],
+                         self._get_emails(mock_send_batch))
+
+    @patch('periods.email_sender.send_batch', return_value=(1, []))
+    @patch('periods.models.today')
+    def test_notify_upcoming_period_queue(self, mock_today, mock_send_batch):
+        mock_today.return_value = pytz.utc.localize(datetime.datetime(2014, 3, 28))
+
+        self.command.handle(queue=True)
+
+        self.assertFalse(mock_send_batch.called)
+        job = period_models.Job.objects.get()
+        self.assertEqual('send_email', job.name)
+        self.assertEqual(self.user.pk, job.kwargs['user_id'])
+        self.assertEqual('Period today!', job.kwargs['subject'])
+        self.assertEqual(['expected_now:0', '2014-03-28'], job.kwargs['notification'])
+        # Nothing is logged until the job has sent the email
+        self.assertFalse(period_models.NotificationLog.objects.exists())
+
+    @patch('periods.models.today')
+    def test_notify_upcoming_period_queue_run_twice(self, mock_today):
+        mock_today.return_value = pytz.utc.localize(datetime.datetime(2014, 3, 28))
+
+        self.command.handle(queue=True)
+        self.command.handle(queue=True)
+
+        self.assertEqual(1, period_models.Job.objects.count())
+
+    @patch('periods.email_sender.send_batch')
+    @patch('periods.models.today')
+    def test_notify_upcoming_period_failures_reported(self, mock_today, mock_send_batch):
+        mock_today.return_value = pytz.utc.localize(datetime.datetime(2014, 3, 28))
+        mock_send_batch.return_value = (0, [(self.user, ValueError('boom'))])
+        self.command.stderr = StringIO()
+
+        self.command.handle()
+
+        self.assertEqual('Failed to email %s: boom' % self.user.email,
+                         self.command.stderr.getvalue())
+        self.assertIn('sent 0, failed 1', self.command.stdout.getvalue())
+        self.assertTrue(self.command.stdout.getvalue().endswith('Sent 0 emails, 1 failed'))
+
+    @patch('periods.email_sender.send_batch', return_value=(1, []))
+    @patch('periods.models.today')
+    def test_notify_upcoming_period_selects_due_users_only(self, mock_today, mock_send_batch):
+        mock_today.return_value = pytz.utc.localize(datetime.datetime(2014, 3, 28))
+        for i in range(3):
+            FlowEventFactory(timestamp=pytz.utc.localize(datetime.datetime(2014, 3, 10)))
+
+        self.command.handle()
+
+        # Sent ledger, users and checkpoint, however many users are not due
+        with self.assertNumQueries(3):
+            emails = self._get_emails(mock_send_batch)
+        self.assertEqual([self.user], [email[0] for email in emails])
+
+    @patch('periods.models.today')
+    def test_notify_upcoming_period_workers(self, mock_today):
+        mock_today.return_value = pytz.utc.localize(datetime.datetime(2014, 3, 28))
+        for i in range(3):
+            FlowEventFactory()
+
+        with patch.object(self.command, '_send_partition',
+                          return_value=(1, [], 0.5)) as mock_send:
+            self.command.handle(workers=2, shard=(1, 3))
+
+        self.assertEqual(2, mock_send.call_count)
+        partitions = sorted(call[0][1] for call in mock_send.call_args_list)
+        self.assertEqual([(1, 6), (4, 6)], partitions)
+        self.assertIn('Users with id % 6 == 1: sent 1, failed 0 in 0.5s (2.0 emails/s)',
+                      self.command.stdout.getvalue())
+        self.assertTrue(self.command.stdout.getvalue().endswith('Sent 2 emails, 0 failed'))
+
+    @patch('periods.email_sender.send_batch', return_value=(1, []))
+    @patch('periods.models.today')
+    def test_notify_upcoming_period_shard(self, mock_today, mock_send_batch):
+        mock_today.return_value = pytz.utc.localize(datetime.datetime(2014, 3, 28))
+        other_user = FlowEventFactory(
+            timestamp=pytz.utc.localize(datetime.datetime(2014, 2, 28))).user
+
+        shard = other_user.pk % 2
+
+        self.command.handle(shard=(shard, 2))
+
+        self.assertEqual([user for user in (self.user, other_user) if user.pk % 2 == shard],
+                         [email[0] for email in self._get_emails(mock_send_batch)])
+
+    @patch('periods.models.today')
+    def test_notify_upcoming_period_shards_stable(self, mock_today):
+        # Users becoming due between the shard processes do not move the other users
+        mock_today.return_value = pytz.utc.localize(datetime.datetime(2014, 3, 28))
+        users = [self.user] + [FlowEventFactory(
+            timestamp=pytz.utc.localize(datetime.datetime(2014, 2, 28))).user for i in range(3)]
+        emailed = []
+
+        def send_batch(emails, batch_size, on_sent=None):
+            emailed.extend(email[0] for email in emails)
+            return len(emailed), []
+
+        with patch('periods.email_sender.send_batch', side_effect=send_batch):
+            self.command.handle(shard=(0, 2))
+            FlowEventFactory(timestamp=pytz.utc.localize(datetime.datetime(2014, 2, 28)))
+            self.command.handle(shard=(1, 2))
+
+        self.assertEqual(len(emailed), len(set(emailed)))
+        self.assertTrue(set(users) <= set(emailed))
+
+    def test_parse_shard(self):
+        self.assertEqual((1, 4), notify_upcoming_period.parse_shard('1/4'))
+
+    def test_parse_shard_invalid(self):
+        for value in ('1', 'a/b', '4/4'):
+            with self.assertRaises(argparse.ArgumentTypeError):
+                notify_upcoming_period.parse_shard(value)
+
+    @patch('periods.models.today')
+    def test_notify_upcoming_period_sent_once(self, mock_today):
+        mock_today.return_value = pytz.utc.localize(datetime.datetime(2014, 3, 28))
+
+        self.command.handle()
+        self.command.handle()
+
+        self.assertEqual(1, len(mail.outbox))
+        log = period_models.NotificationLog.objects.get()
+        self.assertEqual(self.user, log.user)
+        self.assertEqual('expected_now:0', log.notification_type)
+        self.assertEqual(datetime.date(2014, 3, 28), log.expected_date)
+
+    @patch('periods.models.today')
+    def test_notify_upcoming_period_repeated_daily(self, mock_today):
+        for day in (25, 26, 28, 29):
+            mock_today.return_value = pytz.utc.localize(datetime.datetime(2014, 3, day))
+            self.command.handle()
+
+        self.assertEqual(4, len(mail.outbox))
+        self.assertEqual(4, period_models.NotificationLog.objects.count())
+
+    @patch('periods.models.today')
+    def test_notify_upcoming_period_resume(self, mock_today):
+        mock_today.return_value = pytz.utc.localize(datetime.datetime(2014, 3, 28))
+        other_user = FlowEventFactory(
+            timestamp=pytz.utc.localize(datetime.datetime(2014, 2, 28))).user
+        period_models.Checkpoint.objects.create(
+            name='notify_upcoming_period:0/1',
+            run_date=datetime.date(2014, 3, 28), last_id=self.user.pk)
+
+        self.command.handle(resume=True)
+
+        self.assertEqual(1, len(mail.outbox))
+        self.assertIn(other_user.email, mail.outbox[0].to[0])
+        checkpoint = period_models.Checkpoint.objects.get()
+        self.assertEqual(other_user.pk, checkpoint.last_id)
+
+    @patch('periods.models.today')
+    def test_notify_upcoming_period_resume_after_failure(self, mock_today):
+        mock_today.return_value = pytz.utc.localize(datetime.datetime(2014, 3, 28))
+        other_user = FlowEventFactory(
+            timestamp=pytz.utc.localize(datetime.datetime(2014, 2, 28))).user
+        sent = []
+
+        def send_batch(emails, batch_size, on_sent=None):
+            # The first email fails, the others are sent
+            failures = []
+            for email in emails:
+                if email[0] == self.user:
+                    failures.append((email[0], ValueError('boom')))
+                else:
+                    sent.append(email[0])
+                    on_sent(*email)
+            return len(sent), failures
+
+        with patch('periods.email_sender.send_batch', side_effect=send_batch):
+            self.command.handle()
+
+        self.assertEqual([other_user], sent)
+        self.assertEqual(self.user.pk - 1, period_models.Checkpoint.objects.get().last_id)
+
+        self.command.handle(resume=True)
+
+        # Only the failed email is sent again
+        self.assertEqual([self.user], [user for user in period_models.User.objects.filter(
+            email__in=[message.to[0].split('<')[1][:-1] for message in mail.outbox])])
+
+    @patch('periods.models.today')
+    def test_notify_upcoming_period_no_resume(self, mock_today):
+        mock_today.return_value = pytz.utc.localize(datetime.datetime(2014, 3, 28))
+        period_models.Checkpoint.objects.create(
+            name='notify_upcoming_period:0/1',
+            run_date=datetime.date(2014, 3, 28), last_id=self.user.pk)
+
+        self.command.handle()
+
+        self.assertEqual(1, len(mail.outbox))
+
+    def _add_users(self, timestamp):
+        def add_users(num_users):
+            for i in range(num_users):
+                FlowEventFactory(timestamp=pytz.utc.localize(timestamp))
+        return add_users
+
+    @patch('periods.models.today')
+    def test_notify_upcoming_period_query_count_not_due(self, mock_today):
+        mock_today.return_value = pytz.utc.localize(datetime.datetime(2014, 3, 28))
+
+        self.assertQueriesPerUser(0, self.command.handle,
+                                  self._add_users(datetime.datetime(2014, 3, 10)))
+
+    @patch('periods.models.today')
+    def test_notify_upcoming_period_query_count_due(self, mock_today):
+        mock_today.return_value = pytz.utc.localize(datetime.datetime(2014, 3, 28))
+
+        # Recording each email in the ledger (get_or_create in a savepoint)
+        self.assertQueriesPerUser(4, self.command.handle,
+                                  self._add_users(datetime.datetime(2014, 2, 28)))
@@ -0,0 +1,28 @@
+import datetime
+
+from django.test import TestCase
+from django.utils import timezone
+from django.utils.six import StringIO
+
+from periods import models as period_models
+from periods.management.commands import prune_deleted_flow_events
+from periods.tests.factories import FlowEventFactory
+
+
+class TestCommand(TestCase):
+    def setUp(self):
+        self.stdout = StringIO()
+        self.command = prune_deleted_flow_events.Command(stdout=self.stdout)
+        flow_event = FlowEventFactory()
+        self.user = flow_event.user
+        flow_event.delete()
+        FlowEventFactory(user=self.user).delete()
+        first_id = period_models.DeletedFlowEvent.objects.order_by('id').first().pk
+        period_models.DeletedFlowEvent.objects.filter(pk=first_id).update(
+            deleted_at=timezone.now() - datetime.timedelta(days=91))
+
+    def test_prune(self):
+        self.command.handle()
+
+        self.assertEqual(1, period_models.DeletedFlowEvent.objects.count())
+        self.assertIn('Pruned 1 deleted flow events', self.stdout.getvalue())
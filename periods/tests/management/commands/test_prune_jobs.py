@@ -0,0 +1,31 @@
+import datetime
+
+from django.test import TestCase
+from django.utils import timezone
+from django.utils.six import StringIO
+
+from periods import models as period_models
+from periods.management.commands import prune_jobs
+
+
+class TestCommand(TestCase):
+    def setUp(self):
+        self.stdout = StringIO()
+        self.command = prune_jobs.Command(stdout=self.stdout)
+        old = timezone.now() - datetime.timedelta(days=8)
+        for status in [period_models.JobStatus.QUEUED, period_models.JobStatus.RUNNING,
+                       period_models.JobStatus.DONE, period_models.JobStatus.FAILED]:
+            job = period_models.Job.enqueue('send_email', user_id=1)
+            period_models.Job.objects.filter(pk=job.pk).update(status=status, updated_at=old)
+        period_models.Job.objects.filter(pk=period_models.Job.enqueue('send_email').pk).update(
+            status=period_models.JobStatus.DONE)
+
+    def test_prune(self):
+        self.command.handle()
+
+        # Old finished jobs are deleted; queued, running and recent jobs are kept
+        self.assertEqual(
+            [period_models.JobStatus.QUEUED, period_models.JobStatus.RUNNING,
+             period_models.JobStatus.DONE],
+            list(period_models.Job.objects.order_by('id').values_list('status', flat=True)))
+        self.assertIn('Pruned 2 jobs', self.stdout.getvalue())
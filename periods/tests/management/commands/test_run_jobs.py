@@ -0,0 +1,36 @@
+from django.test import TestCase
+from mock import patch
+
+from periods import models as period_models
+from periods.management.commands import run_jobs
+from periods.tests.factories import UserFactory
+
+
+class TestCommand(TestCase):
+
+    def setUp(self):
+        self.command = run_jobs.Command()
+        self.user = UserFactory()
+
+    @patch('periods.email_sender.send')
+    def test_run_jobs_burst(self, mock_send):
+        mock_send.side_effect = [None, ValueError('boom')]
+        for subject in ('One', 'Two'):
+            period_models.Job.enqueue('send_email', max_attempts=1, user_id=self.user.pk,
+                                      subject=subject, text_body='Hello')
+
+        with patch.object(self.command, 'stdout') as mock_stdout:
+            self.command.handle(workers=1, burst=True)
+
+        mock_stdout.write.assert_called_once_with('1 done, 1 failed')
+        self.assertEqual(2, mock_send.call_count)
+        self.assertFalse(period_models.Job.objects.filter(
+            status=period_models.JobStatus.QUEUED).exists())
+
+    @patch('periods.email_sender.send')
+    def test_run_jobs_burst_empty(self, mock_send):
+        with patch.object(self.command, 'stdout') as mock_stdout:
+            self.command.handle(workers=1, burst=True)
+
+        self.assertFalse(mock_stdout.write.called)
+        self.assertFalse(mock_send.called)
@@ -0,0 +1,27 @@
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryCountTestMixin(object):
+    # Checks that a bulk operation runs a fixed number of queries per user, so that a per-user
+    # query creeping into a loop fails a test
+
+    def count_queries(self, run):
+        # Any changes made by run are rolled back, so it can be repeated from the same state
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as context:
+                run()
+            transaction.set_rollback(True)
+        return len(context)
+
+    def assertQueriesPerUser(self, expected, run, add_users, num_users=5):
+        add_users(num_users)
+        # Warm up any process-level caches first
+        self.count_queries(run)
+        first_count = self.count_queries(run)
+        add_users(num_users)
+        second_count = self.count_queries(run)
+        self.assertEqual(
+            expected * num_users, second_count - first_count,
+            "%s users ran %s queries, %s users ran %s; expected %s extra queries per user" % (
+                num_users, first_count, 2 * num_users, second_count, expected))
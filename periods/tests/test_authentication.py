@@ -0,0 +1,56 @@
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework import exceptions
+
+from periods import authentication
+from periods.tests.factories import UserFactory
+
+
+class TestCachingTokenAuthentication(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.authentication = authentication.CachingTokenAuthentication()
+        self.user = UserFactory()
+        self.key = self.user.auth_token.key
+
+    def test_authenticate_credentials(self):
+        with self.assertNumQueries(2):
+            user, token = self.authentication.authenticate_credentials(self.key)
+
+        self.assertEqual(self.user, user)
+        self.assertEqual(self.key, token.key)
+        self.assertEqual(self.user.timezone, user.timezone)
+        self.assertTrue({'password', 'first_name', 'last_name'} <= user.get_deferred_fields())
+
+    def test_authenticate_credentials_cached(self):
+        self.authentication.authenticate_credentials(self.key)
+
+        # Only the user is fetched
+        with self.assertNumQueries(1):
+            user, token = self.authentication.authenticate_credentials(self.key)
+
+        self.assertEqual(self.user, user)
+
+    def test_cache_key_hashed(self):
+        self.assertNotIn(self.key, authentication._get_cache_key(self.key))
+
+    def test_authenticate_credentials_invalid(self):
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.authentication.authenticate_credentials('bogus')
+
+    def test_authenticate_credentials_inactive(self):
+        self.user.is_active = False
+        self.user.save()
+
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.authentication.authenticate_credentials(self.key)
+
+    def test_invalidate_token(self):
+        self.authentication.authenticate_credentials(self.key)
+        self.user.auth_token.delete()
+
+        authentication.invalidate_token(self.key)
+
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.authentication.authenticate_credentials(self.key)
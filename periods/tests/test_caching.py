@@ -0,0 +1,86 @@
+from django.core.cache import cache
+from django.test import TestCase
+from mock import MagicMock, patch
+
+from periods import caching
+
+
+class TestGetOrCompute(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        caching.reset_stats()
+
+    def test_miss_then_hit(self):
+        compute = MagicMock(return_value=[28])
+
+        self.assertEqual([28], caching.get_or_compute('key', 'cycle_lengths', compute))
+        self.assertEqual([28], caching.get_or_compute('key', 'cycle_lengths', compute))
+
+        self.assertEqual(1, compute.call_count)
+        stats = caching.get_stats()['cycle_lengths']
+        self.assertEqual(1, stats['hits'])
+        self.assertEqual(1, stats['misses'])
+        self.assertEqual(0.5, stats['hit_rate'])
+
+    def test_empty_result_cached(self):
+        compute = MagicMock(return_value=[])
+
+        self.assertEqual([], caching.get_or_compute('key', 'cycle_lengths', compute))
+        self.assertEqual([], caching.get_or_compute('key', 'cycle_lengths', compute))
+
+        self.assertEqual(1, compute.call_count)
+
+
+class TestIncrement(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        caching.reset_stats()
+
+    def test_batched(self):
+        caching.increment('counter')
+        caching.increment('counter', 2)
+
+        self.assertIsNone(cache.get('counter'))
+
+        caching.flush()
+
+        self.assertEqual(3, cache.get('counter'))
+
+    @patch('periods.caching.FLUSH_INTERVAL', 0)
+    def test_flushed_after_interval(self):
+        caching.increment('counter')
+        caching.increment('counter')
+
+        self.assertEqual(2, cache.get('counter'))
+
+    @patch('periods.caching.cache')
+    def test_flush_existing_counter(self, mock_cache):
+        caching.increment('counter')
+
+        caching.flush()
+
+        # One round trip once the counter exists
+        mock_cache.incr.assert_called_once_with('counter', 1)
+        self.assertFalse(mock_cache.add.called)
+
+
+class TestStats(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        caching.reset_stats()
+
+    def test_get_stats_no_lookups(self):
+        stats = caching.get_stats()
+
+        self.assertEqual({'hits': 0, 'misses': 0, 'recompute_ms': 0, 'hit_rate': None},
+                         stats['sorted_cycle_lengths'])
+
+    def test_reset_stats(self):
+        caching.get_or_compute('key', 'cycle_lengths', lambda: [])
+
+        caching.reset_stats()
+
+        self.assertEqual(0, caching.get_stats()['cycle_lengths']['misses'])
@@ -1,4 +1,5 @@
 from django.contrib.auth import get_user_model
+from django.core import mail
 from django.test import TestCase
 from mock import patch
 
@@ -24,3 +25,78 @@ class TestEmailSender(TestCase):
 
         self.assertEqual(True, result)
         mock_send.assert_called_once_with()
+
+
+class TestSendBatch(TestCase):
+
+    def setUp(self):
+        self.users = [get_user_model().objects.create_user(
+            password='bogus', email='user%s@example.com' % i, first_name=u'User') for i in range(5)]
+        self.items = [(user, 'Hi!', 'good day', '<p>good day</p>') for user in self.users]
+
+    @patch('periods.email_sender.get_connection')
+    def test_send_batch_reuses_connection(self, mock_get_connection):
+        result = email_sender.send_batch(self.items, batch_size=10)
+
+        self.assertEqual((5, []), result)
+        self.assertEqual(1, mock_get_connection.call_count)
+        connection = mock_get_connection.return_value
+        self.assertEqual(5, connection.send_messages.call_count)
+        connection.close.assert_called_once_with()
+
+    @patch('periods.email_sender.get_connection')
+    def test_send_batch_reconnects_per_batch(self, mock_get_connection):
+        result = email_sender.send_batch(self.items, batch_size=2)
+
+        self.assertEqual((5, []), result)
+        self.assertEqual(3, mock_get_connection.call_count)
+        self.assertEqual(3, mock_get_connection.return_value.close.call_count)
+
+    @patch('periods.email_sender.logger')
+    @patch('periods.email_sender.get_connection')
+    def test_send_batch_failure(self, mock_get_connection, mock_logger):
+        error = ValueError('boom')
+        connection = mock_get_connection.return_value
+        connection.send_messages.side_effect = [1, error, 1, 1, 1]
+
+        result = email_sender.send_batch(self.items, batch_size=10)
+
+        self.assertEqual((4, [(self.users[1], error)]), result)
+        self.assertEqual(2, mock_get_connection.call_count)
+        self.assertTrue(mock_logger.exception.called)
+
+    def test_send_batch_outbox(self):
+        email_sender.send_batch(self.items[:2])
+
+        self.assertEqual(2, len(mail.outbox))
+        self.assertEqual(['User <user1@example.com>'], mail.outbox[1].to)
+        self.assertEqual([('<p>good day</p>', 'text/html')], mail.outbox[1].alternatives)
+
+    @patch('periods.email_sender.logger')
+    @patch('periods.email_sender.get_connection')
+    def test_send_batch_on_sent(self, mock_get_connection, mock_logger):
+        mock_get_connection.return_value.send_messages.side_effect = [1, ValueError('boom')]
+        sent = []
+
+        email_sender.send_batch(self.items[:2], on_sent=lambda *item: sent.append(item))
+
+        self.assertEqual([self.items[0]], sent)
+
+
+class TestGetTemplate(TestCase):
+
+    def setUp(self):
+        email_sender.get_template.cache_clear()
+        self.addCleanup(email_sender.get_template.cache_clear)
+
+    @patch('periods.email_sender.loader.get_template')
+    def test_get_template_cached(self, mock_get_template):
+        template = email_sender.get_template('expected_in.txt')
+
+        self.assertEqual(template, email_sender.get_template('expected_in.txt'))
+        mock_get_template.assert_called_once_with('periods/email/expected_in.txt')
+
+    def test_get_template_renders(self):
+        template = email_sender.get_template('notification.txt')
+
+        self.assertIn('eggtimer', template.render({}))
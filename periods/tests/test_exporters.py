@@ -0,0 +1,46 @@
+import datetime
+import pytz
+
+from django.test import TestCase
+
+from periods import exporters, models as period_models
+from periods.tests.factories import FlowEventFactory
+
+
+class TestIterRows(TestCase):
+
+    def setUp(self):
+        self.period = FlowEventFactory()
+        for i in range(4):
+            FlowEventFactory(user=self.period.user, timestamp=pytz.utc.localize(
+                datetime.datetime(2014, 2, 1 + i)), first_day=False)
+
+    def test_iter_rows_batches(self):
+        queryset = period_models.FlowEvent.objects.all()
+
+        with self.assertNumQueries(3):
+            rows = list(exporters.iter_rows(queryset, batch_size=2))
+
+        self.assertEqual(5, len(rows))
+        self.assertEqual(sorted(row['id'] for row in rows), [row['id'] for row in rows])
+        self.assertEqual('2014-01-31T17:00:00+00:00', rows[0]['timestamp'])
+
+    def test_iter_rows_fields(self):
+        rows = list(exporters.iter_rows(period_models.FlowEvent.objects.all(),
+                                        ('user', 'first_day')))
+
+        self.assertEqual({'id': self.period.id, 'user': self.period.user.id, 'first_day': True},
+                         rows[0])
+
+
+class TestRenderers(TestCase):
+
+    def test_csv_render(self):
+        result = exporters.CSVRenderer().render({'detail': 'Not found.'})
+
+        self.assertEqual('detail\r\nNot found.\r\n', result)
+
+    def test_ndjson_render(self):
+        result = exporters.NDJSONRenderer().render({'detail': 'Not found.'})
+
+        self.assertEqual('{"detail": "Not found."}\n', result)
@@ -1,6 +1,11 @@
+import datetime
+import pytz
+
+from django.contrib.sites.models import Site
 from django.test import TestCase
 
-from periods import helpers
+from periods import helpers, models as period_models
+from periods.tests.factories import FlowEventFactory
 
 
 class TestGetFullDomain(TestCase):
@@ -13,3 +18,49 @@ class TestGetFullDomain(TestCase):
         with self.settings(SECURE_SSL_REDIRECT=True):
             result = helpers.get_full_domain()
             self.assertEqual('https://example.com', result)
+
+
+class TestGetFullDomainCache(TestCase):
+
+    # The current site is cached by django.contrib.sites
+    def setUp(self):
+        Site.objects.clear_cache()
+        self.addCleanup(Site.objects.clear_cache)
+
+    def test_cached(self):
+        helpers.get_full_domain()
+
+        with self.assertNumQueries(0):
+            self.assertEqual('http://example.com', helpers.get_full_domain())
+
+    def test_site_changed(self):
+        helpers.get_full_domain()
+        site = Site.objects.get_current()
+        site.domain = 'eggtimer.example.com'
+
+        site.save()
+
+        self.assertEqual('http://eggtimer.example.com', helpers.get_full_domain())
+
+
+class TestBulkUpdate(TestCase):
+
+    def setUp(self):
+        self.periods = [FlowEventFactory(), FlowEventFactory()]
+
+    def test_bulk_update(self):
+        for i, period in enumerate(self.periods):
+            period.timestamp = pytz.utc.localize(datetime.datetime(2015, 1, i + 1))
+            period.level = i
+
+        with self.assertNumQueries(1):
+            helpers.bulk_update(self.periods, ['timestamp', 'level'])
+
+        for i, period in enumerate(self.periods):
+            period = period_models.FlowEvent.objects.get(pk=period.pk)
+            self.assertEqual(pytz.utc.localize(datetime.datetime(2015, 1, i + 1)), period.timestamp)
+            self.assertEqual(i, period.level)
+
+    def test_bulk_update_empty(self):
+        with self.assertNumQueries(0):
+            helpers.bulk_update([], ['timestamp'])
@@ -0,0 +1,83 @@
+import datetime
+from io import BytesIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError
+from django.test import TestCase
+from mock import patch
+
+from periods import importers, models as period_models
+from periods.tests.factories import FlowEventFactory, UserFactory
+
+
+class TestGetFormat(TestCase):
+
+    def test_extension(self):
+        self.assertEqual('ndjson', importers.get_format(SimpleUploadedFile('a.JSONL', b'x')))
+
+    def test_guess_csv(self):
+        upload = SimpleUploadedFile('upload', b'timestamp\n')
+
+        self.assertEqual('csv', importers.get_format(upload))
+        self.assertEqual(b'timestamp\n', upload.read())
+
+
+class TestIterRows(TestCase):
+
+    def test_csv_rows(self):
+        lines = BytesIO(b'\xef\xbb\xbftimestamp,comment,level\n2014-01-31,,1\n')
+
+        self.assertEqual([(2, {'timestamp': '2014-01-31', 'level': '1'})],
+                         list(importers.iter_csv_rows(lines)))
+
+    def test_ndjson_rows(self):
+        lines = BytesIO(b'{"level": 1}\n[1]\n\n{\n')
+
+        rows = list(importers.iter_ndjson_rows(lines))
+
+        self.assertEqual((1, {'level': 1}), rows[0])
+        self.assertEqual([2, 4], [line_number for line_number, row in rows[1:]])
+        self.assertTrue(all(isinstance(row, ValueError) for line_number, row in rows[1:]))
+
+
+class TestImportFlowEvents(TestCase):
+
+    def setUp(self):
+        self.user = UserFactory()
+        self.rows = [(i + 1, {'timestamp': '2014-01-%02dT00:00:00Z' % (i + 1)})
+                     for i in range(5)]
+
+    @patch('periods.models.FlowEvent.objects.bulk_create')
+    def test_batches(self, mock_bulk_create):
+        summary = importers.import_flow_events(self.user, self.rows, batch_size=2)
+
+        self.assertEqual({'created': 5, 'failed': 0, 'errors': []}, summary)
+        self.assertEqual([2, 2, 1], [len(call[0][0]) for call in mock_bulk_create.call_args_list])
+
+    def test_failed_batch_rolls_back(self):
+        bulk_create = period_models.FlowEvent.objects.bulk_create
+        results = [None, DatabaseError('boom')]
+
+        def create_then_fail(flow_events):
+            result = results.pop(0)
+            if result:
+                raise result
+            return bulk_create(flow_events)
+
+        rows = [(i + 1, {'timestamp': '2014-0%s-01T00:00:00Z' % (i + 1), 'first_day': True})
+                for i in range(4)]
+        with patch('periods.models.FlowEvent.objects.bulk_create', side_effect=create_then_fail):
+            with self.assertRaises(DatabaseError):
+                importers.import_flow_events(self.user, rows, batch_size=2)
+
+        self.assertEqual(0, period_models.FlowEvent.objects.filter(user=self.user).count())
+        FlowEventFactory(user=self.user)
+        self.assertEqual(1, self.user.cycles.count())
+
+    def test_import(self):
+        importers.import_flow_events(self.user, self.rows + [(6, ValueError('Invalid'))])
+
+        events = period_models.FlowEvent.objects.filter(user=self.user).order_by('timestamp')
+        self.assertEqual(5, events.count())
+        self.assertEqual(datetime.date(2014, 1, 5), events.last().timestamp.date())
+        self.assertFalse(events.first().first_day)
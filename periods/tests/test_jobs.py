@@ -0,0 +1,212 @@
+import datetime
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from mock import patch
+
+from periods import jobs, models as period_models
+from periods.tests.factories import FlowEventFactory, UserFactory
+
+
+class TestJob(TestCase):
+
+    def test_enqueue(self):
+        job = period_models.Job.enqueue('send_email', user_id=1, subject='Hi', text_body='Hello')
+
+        self.assertEqual(period_models.JobStatus.QUEUED, job.status)
+        self.assertEqual({'user_id': 1, 'subject': 'Hi', 'text_body': 'Hello'}, job.kwargs)
+        self.assertEqual('send_email  (Queued)', '%s' % job)
+
+    def test_enqueue_delay(self):
+        job = period_models.Job.enqueue('update_statistics', delay=30, user_id=1)
+
+        self.assertGreater(job.run_at, timezone.now() + datetime.timedelta(seconds=20))
+        self.assertEqual([], jobs.get_due_jobs(10))
+
+    def test_enqueue_same_key_reuses_queued_job(self):
+        job = period_models.Job.enqueue('update_statistics', key='user-1', user_id=1)
+
+        self.assertEqual(job, period_models.Job.enqueue('update_statistics', key='user-1',
+                                                        user_id=1))
+        self.assertEqual(1, period_models.Job.objects.count())
+
+    def test_enqueue_same_key_after_run_creates_job(self):
+        job = period_models.Job.enqueue('update_statistics', key='user-1', user_id=1)
+        job.status = period_models.JobStatus.DONE
+        job.save()
+
+        period_models.Job.enqueue('update_statistics', key='user-1', user_id=1)
+
+        self.assertEqual(2, period_models.Job.objects.count())
+
+
+class TestRunPending(TestCase):
+
+    def setUp(self):
+        self.user = UserFactory()
+
+    @patch('periods.email_sender.send')
+    def test_success(self, mock_send):
+        job = period_models.Job.enqueue('send_email', user_id=self.user.pk, subject='Hi',
+                                        text_body='Hello')
+
+        self.assertEqual({period_models.JobStatus.DONE: 1}, jobs.run_pending())
+
+        mock_send.assert_called_once_with(self.user, 'Hi', 'Hello', None)
+        job.refresh_from_db()
+        self.assertEqual(period_models.JobStatus.DONE, job.status)
+        self.assertEqual(1, job.attempts)
+
+    @patch('periods.email_sender.send')
+    def test_notification_logged_once_sent(self, mock_send):
+        period_models.Job.enqueue('send_email', user_id=self.user.pk, subject='Hi',
+                                  text_body='Hello', notification=['expected_in:3', '2014-03-31'])
+
+        jobs.run_pending()
+
+        self.assertTrue(mock_send.called)
+        log = period_models.NotificationLog.objects.get()
+        self.assertEqual(('expected_in:3', datetime.date(2014, 3, 31)),
+                         (log.notification_type, log.expected_date))
+
+    @patch('periods.email_sender.send')
+    def test_notification_already_logged(self, mock_send):
+        period_models.NotificationLog.objects.create(
+            user=self.user, notification_type='expected_in:3',
+            expected_date=datetime.date(2014, 3, 31))
+        period_models.Job.enqueue('send_email', user_id=self.user.pk, subject='Hi',
+                                  text_body='Hello', notification=['expected_in:3', '2014-03-31'])
+
+        self.assertEqual({period_models.JobStatus.DONE: 1}, jobs.run_pending())
+
+        self.assertFalse(mock_send.called)
+
+    @patch('periods.email_sender.send', side_effect=ValueError('boom'))
+    def test_notification_not_logged_on_failure(self, mock_send):
+        period_models.Job.enqueue('send_email', user_id=self.user.pk, subject='Hi',
+                                  text_body='Hello', max_attempts=1,
+                                  notification=['expected_in:3', '2014-03-31'])
+
+        self.assertEqual({period_models.JobStatus.FAILED: 1}, jobs.run_pending())
+
+        self.assertFalse(period_models.NotificationLog.objects.exists())
+
+    @override_settings(JOB_RETRY_DELAY=60)
+    @patch('periods.email_sender.send')
+    def test_failure_retried_later(self, mock_send):
+        mock_send.side_effect = ValueError('boom')
+        job = period_models.Job.enqueue('send_email', user_id=self.user.pk, subject='Hi',
+                                        text_body='Hello')
+
+        self.assertEqual({period_models.JobStatus.QUEUED: 1}, jobs.run_pending())
+
+        job.refresh_from_db()
+        self.assertEqual(period_models.JobStatus.QUEUED, job.status)
+        self.assertEqual(1, job.attempts)
+        self.assertIn('ValueError: boom', job.last_error)
+        self.assertGreater(job.run_at, timezone.now() + datetime.timedelta(seconds=50))
+        self.assertEqual({}, jobs.run_pending())
+
+    @patch('periods.email_sender.send')
+    def test_failure_after_max_attempts(self, mock_send):
+        mock_send.side_effect = ValueError('boom')
+        job = period_models.Job.enqueue('send_email', max_attempts=1, user_id=self.user.pk,
+                                        subject='Hi', text_body='Hello')
+
+        self.assertEqual({period_models.JobStatus.FAILED: 1}, jobs.run_pending())
+
+        job.refresh_from_db()
+        self.assertEqual(period_models.JobStatus.FAILED, job.status)
+
+    def test_lease_expired_reclaimed(self):
+        job = period_models.Job.enqueue('update_statistics', user_id=self.user.pk)
+        self.assertTrue(jobs.claim(job))
+        # The worker was killed while running the job
+        period_models.Job.objects.filter(pk=job.pk).update(
+            updated_at=timezone.now() - datetime.timedelta(seconds=901))
+
+        self.assertEqual({period_models.JobStatus.DONE: 1}, jobs.run_pending())
+
+        job.refresh_from_db()
+        self.assertEqual(2, job.attempts)
+
+    def test_lease_not_expired(self):
+        job = period_models.Job.enqueue('update_statistics', user_id=self.user.pk)
+        self.assertTrue(jobs.claim(job))
+
+        self.assertEqual({}, jobs.run_pending())
+
+    def test_lease_expired_after_max_attempts(self):
+        job = period_models.Job.enqueue('update_statistics', user_id=self.user.pk)
+        period_models.Job.objects.filter(pk=job.pk).update(
+            status=period_models.JobStatus.RUNNING, attempts=3,
+            updated_at=timezone.now() - datetime.timedelta(seconds=901))
+
+        self.assertEqual({None: 1}, jobs.run_pending())
+
+        job.refresh_from_db()
+        self.assertEqual(period_models.JobStatus.FAILED, job.status)
+        self.assertEqual('Worker lost after 3 attempts', job.last_error)
+
+    def test_already_claimed(self):
+        job = period_models.Job.enqueue('update_statistics', user_id=self.user.pk)
+        period_models.Job.objects.filter(pk=job.pk).update(status=period_models.JobStatus.RUNNING)
+
+        self.assertFalse(jobs.claim(job))
+        self.assertIsNone(jobs._process(job))
+
+    @override_settings(STATISTICS_UPDATE_MODE='queue', STATISTICS_UPDATE_DELAY=0)
+    def test_statistics_queue_mode(self):
+        flow_event = FlowEventFactory(user=self.user)
+        FlowEventFactory(user=self.user,
+                         timestamp=flow_event.timestamp + datetime.timedelta(days=30))
+
+        self.assertEqual(1, period_models.Job.objects.filter(name='update_statistics').count())
+        statistics = period_models.Statistics.objects.get(user=self.user)
+        self.assertEqual(28, statistics.average_cycle_length)
+
+        self.assertEqual({period_models.JobStatus.DONE: 1}, jobs.run_pending())
+
+        statistics.refresh_from_db()
+        self.assertEqual(30, statistics.average_cycle_length)
+
+
+class TestPrefetchMoonPhases(TestCase):
+
+    def setUp(self):
+        self.from_date = datetime.date(2016, 10, 1)
+        self.to_date = datetime.date(2016, 11, 5)
+
+    def test_prefetch_next(self):
+        job = period_models.AerisData.prefetch_next(self.from_date, self.to_date)
+
+        self.assertEqual('prefetch_moon_phases', job.name)
+        self.assertEqual({'from_date': '2016-11-05', 'to_date': '2016-12-10'}, job.kwargs)
+
+    def test_prefetch_next_once(self):
+        period_models.AerisData.prefetch_next(self.from_date, self.to_date)
+        period_models.AerisData.prefetch_next(self.from_date, self.to_date)
+
+        self.assertEqual(1, period_models.Job.objects.count())
+
+    def test_prefetch_next_running(self):
+        job = period_models.AerisData.prefetch_next(self.from_date, self.to_date)
+        period_models.Job.objects.filter(pk=job.pk).update(status=period_models.JobStatus.RUNNING)
+
+        self.assertIsNone(period_models.AerisData.prefetch_next(self.from_date, self.to_date))
+        self.assertEqual(1, period_models.Job.objects.count())
+
+    @patch('periods.models.AerisData.get_from_server')
+    def test_get_for_date_fetch_failed(self, mock_get_from_server):
+        mock_get_from_server.return_value = {'error': 'Unable to reach Moon Phase API'}
+
+        period_models.AerisData.get_for_date('2016-10-01', '2016-11-05')
+
+        self.assertFalse(period_models.Job.objects.exists())
+
+    @patch('periods.models.AerisData.get_for_date')
+    def test_task(self, mock_get_for_date):
+        jobs.TASKS['prefetch_moon_phases'](from_date='2016-11-05', to_date='2016-12-10')
+
+        # The prefetch does not chain further prefetches
+        mock_get_for_date.assert_called_once_with('2016-11-05', '2016-12-10', prefetch_next=False)
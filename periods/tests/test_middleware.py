@@ -0,0 +1,97 @@
+import time
+
+from django.contrib import auth
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+
+from periods import middleware
+from periods.tests.factories import UserFactory
+
+
+class TestAddAuthTokenMiddleware(TestCase):
+
+    def setUp(self):
+        self.middleware = middleware.AddAuthTokenMiddleware()
+        self.user = UserFactory()
+        self.request = RequestFactory().get('/')
+        self.request.user = self.user
+        self.request.session = {auth.SESSION_KEY: str(self.user.pk)}
+
+    def test_anonymous_user(self):
+        self.request.user = AnonymousUser()
+
+        response = self.middleware.process_response(self.request, HttpResponse())
+
+        self.assertNotIn('auth_token', response.cookies)
+
+    def test_token_not_in_session(self):
+        with self.assertNumQueries(1):
+            response = self.middleware.process_response(self.request, HttpResponse())
+
+        self.assertEqual(self.user.auth_token.key, response.cookies['auth_token'].value)
+        self.assertEqual(self.user.auth_token.key,
+                         self.request.session[middleware.AUTH_TOKEN_SESSION_KEY]['key'])
+
+    def test_token_in_session_cookie_current(self):
+        middleware.set_session_token(self.request.session, 'current')
+        self.request.COOKIES['auth_token'] = 'current'
+
+        with self.assertNumQueries(0):
+            response = self.middleware.process_response(self.request, HttpResponse())
+
+        self.assertNotIn('auth_token', response.cookies)
+
+    def test_token_in_session_cookie_stale(self):
+        middleware.set_session_token(self.request.session, 'current')
+        self.request.COOKIES['auth_token'] = 'stale'
+
+        with self.assertNumQueries(0):
+            response = self.middleware.process_response(self.request, HttpResponse())
+
+        self.assertEqual('current', response.cookies['auth_token'].value)
+
+    def test_token_in_session_rechecked(self):
+        self.request.session[middleware.AUTH_TOKEN_SESSION_KEY] = {
+            'key': 'regenerated', 'checked': time.time() - middleware.AUTH_TOKEN_CHECK_INTERVAL - 1}
+        self.request.COOKIES['auth_token'] = 'regenerated'
+
+        with self.assertNumQueries(1):
+            response = self.middleware.process_response(self.request, HttpResponse())
+
+        self.assertEqual(self.user.auth_token.key, response.cookies['auth_token'].value)
+        self.assertEqual(self.user.auth_token.key,
+                         self.request.session[middleware.AUTH_TOKEN_SESSION_KEY]['key'])
+
+    def test_token_deleted(self):
+        self.user.auth_token.delete()
+        self.request.session[middleware.AUTH_TOKEN_SESSION_KEY] = {'key': 'deleted', 'checked': 0}
+
+        response = self.middleware.process_response(self.request, HttpResponse())
+
+        self.assertNotIn('auth_token', response.cookies)
+        self.assertNotIn(middleware.AUTH_TOKEN_SESSION_KEY, self.request.session)
+
+    def test_api_client(self):
+        self.request.session = {}
+
+        with self.assertNumQueries(0):
+            response = self.middleware.process_response(self.request, HttpResponse())
+
+        self.assertNotIn('auth_token', response.cookies)
+        self.assertEqual({}, self.request.session)
+
+    def test_authorization_header(self):
+        self.request.META['HTTP_AUTHORIZATION'] = 'Token %s' % self.user.auth_token.key
+
+        with self.assertNumQueries(0):
+            response = self.middleware.process_response(self.request, HttpResponse())
+
+        self.assertNotIn('auth_token', response.cookies)
+
+    def test_no_session(self):
+        del self.request.session
+
+        response = self.middleware.process_response(self.request, HttpResponse())
+
+        self.assertNotIn('auth_token', response.cookies)
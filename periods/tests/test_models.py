@@ -5,7 +5,10 @@ import requests
 
 from django.conf import settings
 from django.contrib.auth import models as auth_models
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from mock import MagicMock, patch
 
 from periods import models as period_models
@@ -28,9 +31,42 @@ class TestUser(TestCase):
     def test_get_cycle_lengths_no_data(self):
         self.assertEqual([], self.basic_user.get_cycle_lengths())
 
+    def test_get_cycle_lengths_empty_cached(self):
+        self.assertEqual([], self.user.get_cycle_lengths())
+
+        with self.assertNumQueries(0):
+            self.assertEqual([], self.user.get_cycle_lengths())
+
     def test_get_cycle_lengths(self):
         self.assertEqual([27, 25], self.period.user.get_cycle_lengths())
 
+    def test_get_cycle_lengths_single_query(self):
+        for i in range(1, 10):
+            FlowEventFactory(user=self.period.user, timestamp=TIMEZONE.localize(
+                datetime.datetime(2014, 3, 24) + datetime.timedelta(days=i)))
+        cache.clear()
+
+        with self.assertNumQueries(1):
+            cycle_lengths = self.period.user.get_cycle_lengths()
+
+        self.assertEqual([27, 25] + [1] * 9, cycle_lengths)
+
+    def test_invalidate_cache(self):
+        key = self.period.user.get_cache_key('cycle_lengths')
+        cache.set(key, [1, 2])
+
+        self.period.user.invalidate_cache()
+
+        self.assertNotEqual(key, self.period.user.get_cache_key('cycle_lengths'))
+        self.assertEqual([27, 25], self.period.user.get_cycle_lengths())
+
+    def test_invalidate_cache_no_generation(self):
+        cache.clear()
+
+        self.period.user.invalidate_cache()
+
+        self.assertIsNotNone(self.period.user.get_cache_generation())
+
     def test_get_sorted_cycle_lengths_no_data(self):
         self.assertEqual([], self.basic_user.get_sorted_cycle_lengths())
 
@@ -63,6 +99,101 @@ class TestFlowEvent(TestCase):
         self.assertEqual('Jessamyn Medium (2014-01-31 17:00:00+00:00)', '%s' % self.period)
 
 
+class TestCycle(TestCase):
+    def setUp(self):
+        self.period = FlowEventFactory()
+        self.user = self.period.user
+        self.last_period = FlowEventFactory(
+            user=self.user, timestamp=pytz.utc.localize(datetime.datetime(2014, 3, 24)))
+
+    def _get_cycles(self):
+        return list(self.user.cycles.values_list('index', 'start_date', 'length'))
+
+    def test_first_day_appended(self):
+        self.assertEqual([(0, datetime.date(2014, 1, 31), 52),
+                          (1, datetime.date(2014, 3, 24), None)], self._get_cycles())
+
+    def test_first_day_inserted_between(self):
+        FlowEventFactory(user=self.user,
+                         timestamp=pytz.utc.localize(datetime.datetime(2014, 2, 27)))
+
+        self.assertEqual([(0, datetime.date(2014, 1, 31), 27),
+                          (1, datetime.date(2014, 2, 27), 25),
+                          (2, datetime.date(2014, 3, 24), None)], self._get_cycles())
+
+    def test_not_first_day_ignored(self):
+        FlowEventFactory(user=self.user, first_day=False,
+                         timestamp=pytz.utc.localize(datetime.datetime(2014, 2, 27)))
+
+        self.assertEqual(2, self.user.cycles.count())
+
+    def test_first_day_moved(self):
+        self.period.timestamp = pytz.utc.localize(datetime.datetime(2014, 4, 20))
+        self.period.save()
+
+        self.assertEqual([(0, datetime.date(2014, 3, 24), 27),
+                          (1, datetime.date(2014, 4, 20), None)], self._get_cycles())
+
+    def test_first_day_unset(self):
+        self.last_period.first_day = False
+        self.last_period.save()
+
+        self.assertEqual([(0, datetime.date(2014, 1, 31), None)], self._get_cycles())
+
+    def test_first_day_deleted(self):
+        middle = FlowEventFactory(user=self.user,
+                                  timestamp=pytz.utc.localize(datetime.datetime(2014, 2, 27)))
+
+        middle.delete()
+
+        self.assertEqual([(0, datetime.date(2014, 1, 31), 52),
+                          (1, datetime.date(2014, 3, 24), None)], self._get_cycles())
+
+    @patch('periods.models._lock_user')
+    def test_insert_locks_user(self, mock_lock_user):
+        FlowEventFactory(user=self.user,
+                         timestamp=pytz.utc.localize(datetime.datetime(2014, 2, 27)))
+
+        mock_lock_user.assert_called_with(self.user.pk)
+
+    def test_insert_rolled_back_on_error(self):
+        # Written without signals, so that no cycle is inserted yet
+        period_models.FlowEvent.objects.bulk_create([period_models.FlowEvent(
+            user=self.user, first_day=True,
+            timestamp=pytz.utc.localize(datetime.datetime(2014, 2, 27)))])
+        flow_event = period_models.FlowEvent.objects.get(cycle=None)
+
+        with patch('periods.models.Cycle.objects.create', side_effect=ValueError('boom')):
+            with self.assertRaises(ValueError):
+                period_models.Cycle.insert(flow_event)
+
+        self.assertEqual([(0, datetime.date(2014, 1, 31), 52),
+                          (1, datetime.date(2014, 3, 24), None)], self._get_cycles())
+
+    def test_remove_stale_index(self):
+        # Another writer inserted an earlier cycle after this one was read
+        cycle = self.last_period.cycle
+        FlowEventFactory(user=self.user,
+                         timestamp=pytz.utc.localize(datetime.datetime(2014, 2, 27)))
+
+        cycle.remove()
+
+        self.assertEqual([(0, datetime.date(2014, 1, 31), 27),
+                          (1, datetime.date(2014, 2, 27), None)], self._get_cycles())
+
+    def test_rebuild_cycles(self):
+        period_models.Cycle.objects.all().delete()
+
+        self.user.rebuild_cycles()
+
+        self.assertEqual([(0, datetime.date(2014, 1, 31), 52),
+                          (1, datetime.date(2014, 3, 24), None)], self._get_cycles())
+
+    def test_str(self):
+        self.assertEqual('Jessamyn cycle 0 (2014-01-31, 52 days)',
+                         '%s' % self.user.cycles.first())
+
+
 class TestStatistics(TestCase):
     def setUp(self):
         self.user = UserFactory()
@@ -139,6 +270,64 @@ class TestStatistics(TestCase):
         self.assertEqual(datetime.date(2014, 1, 31), stats.first_date)
         self.assertEqual(1, stats.first_day)
 
+    def test_next_dates(self):
+        FlowEventFactory(user=self.period.user,
+                         timestamp=pytz.utc.localize(datetime.datetime(2014, 2, 28)))
+
+        stats = period_models.Statistics.objects.get(user=self.period.user)
+
+        self.assertEqual(datetime.date(2014, 3, 28), stats.next_period_date)
+        self.assertEqual(datetime.date(2014, 3, 14), stats.next_ovulation_date)
+        self.assertEqual(stats.predicted_events[1]['timestamp'], stats.next_period_date)
+
+    def test_next_dates_no_periods(self):
+        self.period.delete()
+
+        stats = period_models.Statistics.objects.get(user=self.period.user)
+
+        self.assertIsNone(stats.next_period_date)
+        self.assertIsNone(stats.next_ovulation_date)
+
+    def test_next_ovulation_date_luteal_phase_length_changed(self):
+        user = self.period.user
+        user.luteal_phase_length = 12
+
+        user.save()
+
+        stats = period_models.Statistics.objects.get(user=user)
+        self.assertEqual(datetime.date(2014, 2, 28), stats.next_period_date)
+        self.assertEqual(datetime.date(2014, 2, 16), stats.next_ovulation_date)
+        self.assertEqual(datetime.date(2014, 2, 16), stats.predicted_events[0]['timestamp'])
+
+    def test_predicted_events_stored(self):
+        stats = period_models.Statistics.objects.get(user=self.period.user)
+
+        with self.assertNumQueries(0):
+            events = stats.predicted_events
+
+        self.assertEqual(6, len(events))
+        self.assertEqual({'timestamp': datetime.date(2014, 2, 28), 'type': 'projected period'},
+                         events[1])
+
+    @override_settings(PREDICTION_HORIZON_CYCLES=5)
+    def test_predicted_events_horizon(self):
+        FlowEventFactory(user=self.period.user,
+                         timestamp=pytz.utc.localize(datetime.datetime(2014, 2, 28)))
+
+        stats = period_models.Statistics.objects.get(user=self.period.user)
+
+        self.assertEqual(10, len(stats.predicted_events))
+        self.assertEqual({'timestamp': datetime.date(2014, 7, 18), 'type': 'projected period'},
+                         stats.predicted_events[-1])
+
+    @patch('periods.models.Statistics.save')
+    def test_next_ovulation_date_other_fields_saved(self, mock_save):
+        self.period.user.luteal_phase_length = 12
+
+        self.period.user.save(update_fields=['last_login'])
+
+        self.assertFalse(mock_save.called)
+
 
 class TestAerisData(TestCase):
     AERIS_DATA = {'error': None, 'response': [
@@ -183,6 +372,7 @@ class TestAerisData(TestCase):
         self.assertEqual({}, result)
         num_current = period_models.AerisData.objects.count()
         self.assertEqual(num_previous, num_current)
+        self.assertFalse(period_models.Job.objects.exists())
 
     @patch('requests.get')
     def test_get_for_date_not_cached_request_success(self, mock_get):
@@ -195,6 +385,19 @@ class TestAerisData(TestCase):
         self.assertEqual(self.AERIS_DATA, result)
         num_current = period_models.AerisData.objects.count()
         self.assertEqual(num_previous + 1, num_current)
+        # The following range is prefetched
+        self.assertEqual({'from_date': '2016-11-06', 'to_date': '2016-12-18'},
+                         period_models.Job.objects.get().kwargs)
+
+    def test_prefetch_next_already_stored(self):
+        period_models.AerisData.objects.create(to_date=datetime.date(2016, 12, 18),
+                                               data=self.AERIS_DATA)
+
+        result = period_models.AerisData.prefetch_next(datetime.date(2016, 9, 25),
+                                                       datetime.date(2016, 11, 6))
+
+        self.assertIsNone(result)
+        self.assertFalse(period_models.Job.objects.exists())
 
     @patch('requests.get')
     def test_get_for_date_cached(self, mock_get):
@@ -242,6 +445,32 @@ class TestSignals(TestCase):
         self.assertEqual(1, groups.count())
         self.assertEqual(0, groups.first().permissions.count())
 
+    def test_record_deleted_flow_event(self):
+        flow_event_id = self.period.id
+
+        self.period.delete()
+
+        deleted = period_models.DeletedFlowEvent.objects.get(user=self.period.user)
+        self.assertEqual(flow_event_id, deleted.flow_event_id)
+
+    def test_record_deleted_flow_event_no_user(self):
+        period = FlowEventFactory(user=None, first_day=False)
+
+        period.delete()
+
+        self.assertEqual(0, period_models.DeletedFlowEvent.objects.count())
+
+    def test_record_deleted_flow_event_user_deleted(self):
+        user = self.period.user
+        FlowEventFactory(user=user).delete()
+        FlowEventFactory(user=user)
+
+        user.delete()
+
+        # Neither the earlier tombstone nor the cascaded deletes leave orphans
+        self.assertEqual(0, period_models.DeletedFlowEvent.objects.count())
+        self.assertEqual({}, period_models._deleting_users.by_user)
+
     @patch('periods.models.Statistics.save')
     def test_update_statistics_deleted_user(self, mock_save):
         self.period.user.delete()
@@ -294,3 +523,57 @@ class TestSignals(TestCase):
                            {'timestamp': datetime.date(2014, 4, 11), 'type': 'projected ovulation'},
                            {'timestamp': datetime.date(2014, 4, 25), 'type': 'projected period'}]
         self.assertEqual(expected_events, stats.predicted_events)
+
+
+@override_settings(STATISTICS_UPDATE_MODE='on_commit')
+class TestStatisticsOnCommit(TransactionTestCase):
+    def setUp(self):
+        self.period = FlowEventFactory()
+        self.user = self.period.user
+
+    @patch('periods.models.recompute_statistics')
+    def test_coalesced_in_transaction(self, mock_recompute_statistics):
+        with transaction.atomic():
+            for day in [1, 2, 3]:
+                FlowEventFactory(user=self.user, first_day=False,
+                                 timestamp=pytz.utc.localize(datetime.datetime(2014, 2, day)))
+            self.assertFalse(mock_recompute_statistics.called)
+
+        mock_recompute_statistics.assert_called_once_with(self.user)
+
+    @patch('periods.models.recompute_statistics')
+    def test_data_version_bumped_once(self, mock_recompute_statistics):
+        with transaction.atomic(), CaptureQueriesContext(connection) as queries:
+            for day in [1, 2, 3]:
+                FlowEventFactory(user=self.user, first_day=False,
+                                 timestamp=pytz.utc.localize(datetime.datetime(2014, 2, day)))
+
+        self.assertEqual(1, len([query for query in queries
+                                 if query['sql'].startswith('UPDATE "periods_statistics"')]))
+
+    @patch('periods.models.recompute_statistics')
+    def test_rolled_back(self, mock_recompute_statistics):
+        try:
+            with transaction.atomic():
+                FlowEventFactory(user=self.user)
+                raise ValueError()
+        except ValueError:
+            pass
+        with transaction.atomic():
+            FlowEventFactory(user=self.user)
+
+        mock_recompute_statistics.assert_called_once_with(self.user)
+
+    @patch('periods.models.recompute_statistics')
+    def test_outside_transaction(self, mock_recompute_statistics):
+        FlowEventFactory(user=self.user)
+
+        mock_recompute_statistics.assert_called_once_with(self.user)
+
+    def test_statistics_updated(self):
+        with transaction.atomic():
+            FlowEventFactory(user=self.user,
+                             timestamp=pytz.utc.localize(datetime.datetime(2014, 2, 25)))
+
+        self.assertEqual(25, period_models.Statistics.objects.get(user=self.user)
+                         .average_cycle_length)
@@ -0,0 +1,82 @@
+import datetime
+import pytz
+
+from django.test import Client, TestCase
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from periods.pagination import TimestampKeysetPagination
+from periods.tests.factories import FlowEventFactory, UserFactory, PASSWORD
+
+
+class TestTimestampKeysetPagination(TestCase):
+
+    def setUp(self):
+        self.user = UserFactory()
+        self.client = Client()
+        self.client.login(email=self.user.email, password=PASSWORD)
+        self.url_path = '/api/v2/periods/'
+        self.periods = []
+        # Two events share a timestamp, to check ties are broken by id
+        for day in [1, 2, 2, 3, 4]:
+            self.periods.append(FlowEventFactory(
+                user=self.user, timestamp=pytz.utc.localize(datetime.datetime(2014, 1, day))))
+        FlowEventFactory(timestamp=pytz.utc.localize(datetime.datetime(2014, 1, 2)))
+
+    def _get_all_pages(self, params):
+        ids = []
+        pages = 0
+        response = self.client.get(self.url_path, params)
+        while True:
+            self.assertEqual(200, response.status_code)
+            pages += 1
+            ids.extend([item['id'] for item in response.json()['results']])
+            if not response.json()['next']:
+                break
+            response = self.client.get(response.json()['next'])
+        return ids, pages
+
+    def test_not_requested(self):
+        response = self.client.get(self.url_path)
+
+        self.assertEqual(5, len(response.json()))
+
+    def test_all_pages(self):
+        ids, pages = self._get_all_pages({'page_size': 2})
+
+        self.assertEqual([period.id for period in self.periods], ids)
+        self.assertEqual(3, pages)
+
+    def test_with_timestamp_filter(self):
+        ids, pages = self._get_all_pages({'page_size': 1, 'min_timestamp': '2014-01-02',
+                                          'max_timestamp': '2014-01-03'})
+
+        self.assertEqual([period.id for period in self.periods[1:4]], ids)
+        self.assertEqual(3, pages)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url_path, {'cursor': 'bogus'})
+
+        self.assertEqual(404, response.status_code)
+
+
+class TestGetPageSize(TestCase):
+
+    def setUp(self):
+        self.pagination = TimestampKeysetPagination()
+
+    def _get_page_size(self, **params):
+        return self.pagination.get_page_size(Request(APIRequestFactory().get('/', params)))
+
+    def test_default(self):
+        self.assertEqual(100, self._get_page_size())
+
+    def test_page_size(self):
+        self.assertEqual(10, self._get_page_size(page_size='10'))
+
+    def test_max_page_size(self):
+        self.assertEqual(1000, self._get_page_size(page_size='5000'))
+
+    def test_invalid(self):
+        for page_size in ['0', '-1', 'bogus']:
+            self.assertEqual(100, self._get_page_size(page_size=page_size))
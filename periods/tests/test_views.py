@@ -2,10 +2,14 @@ import datetime
 import json
 import pytz
 
+from django.contrib.sessions.models import Session
+from django.core import signing
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.urlresolvers import reverse
 from django.http import HttpRequest, QueryDict, Http404
-from django.test import Client, TestCase
-from mock import patch
+from django.test import Client, TestCase, override_settings
+from django.utils import timezone
+from mock import ANY, patch
 from rest_framework.request import Request
 from rest_framework.authtoken.models import Token
 
@@ -50,6 +54,403 @@ class TestFlowEventViewSet(TestCase):
         self.assertEqual(self.request.user, serializer.instance.user)
 
 
+class TestFlowEventBulk(LoggedInUserTestCase):
+
+    def setUp(self):
+        super(TestFlowEventBulk, self).setUp()
+        self.url_path = reverse('periods-bulk')
+        self.period = FlowEventFactory(user=self.user)
+        self.other_period = FlowEventFactory(
+            user=self.user, timestamp=pytz.utc.localize(datetime.datetime(2014, 2, 28)))
+
+    def _post(self, data):
+        return self.client.post(self.url_path, data=json.dumps(data),
+                                content_type='application/json')
+
+    @patch('periods.models.recompute_statistics')
+    def test_bulk(self, mock_recompute_statistics):
+        data = {
+            'upsert': [
+                {'timestamp': '2014-03-28T00:00:00Z', 'first_day': True},
+                {'timestamp': '2014-04-25T00:00:00Z', 'first_day': True},
+                {'id': self.other_period.id, 'timestamp': '2014-03-01T00:00:00Z'},
+            ],
+            'delete': [self.period.id],
+        }
+
+        response = self._post(data)
+
+        self.assertEqual(200, response.status_code)
+        created = list(period_models.FlowEvent.objects.filter(
+            timestamp__gte=pytz.utc.localize(datetime.datetime(2014, 3, 28))).order_by(
+            'timestamp').values_list('pk', flat=True))
+        # Created ids are in the order of the upserts
+        self.assertEqual({'created': 2, 'created_ids': created, 'updated': 1, 'deleted': 1},
+                         response.json())
+        mock_recompute_statistics.assert_called_once_with(self.user)
+        self.assertEqual([27, 28], list(
+            self.user.completed_cycles().values_list('length', flat=True)))
+        self.assertEqual([self.period.id], list(
+            self.user.deleted_flow_events.values_list('flow_event_id', flat=True)))
+
+    def test_bulk_statistics_updated(self):
+        data = {'upsert': [{'timestamp': '2014-03-28T00:00:00Z', 'first_day': True}]}
+
+        response = self._post(data)
+
+        self.assertEqual(200, response.status_code)
+        stats = period_models.Statistics.objects.get(user=self.user)
+        self.assertEqual(28, stats.average_cycle_length)
+
+    def test_bulk_invalid_item(self):
+        data = {
+            'upsert': [
+                {'timestamp': '2014-03-28T00:00:00Z'},
+                {'timestamp': 'bogus'},
+                {'id': 9999, 'level': 1},
+            ],
+            'delete': [self.period.id],
+        }
+
+        response = self._post(data)
+
+        self.assertEqual(400, response.status_code)
+        self.assertEqual(['1', '2'], sorted(response.json()['errors']))
+        self.assertEqual(2, self.user.flow_events.count())
+
+    def test_bulk_invalid_payload(self):
+        response = self._post({'delete': ['bogus']})
+
+        self.assertEqual(400, response.status_code)
+
+    def test_bulk_bool_ids(self):
+        response = self._post({'delete': [True]})
+
+        self.assertEqual(400, response.status_code)
+
+        response = self._post({'upsert': [{'id': True, 'level': 1}]})
+
+        self.assertEqual(400, response.status_code)
+        self.assertEqual({'0': {'id': ['Not found.']}}, response.json()['errors'])
+
+    def test_bulk_payload_not_object(self):
+        response = self._post([{'timestamp': '2014-03-28T00:00:00Z'}])
+
+        self.assertEqual(400, response.status_code)
+        self.assertEqual({'error': "'upsert' must be a list and 'delete' a list of ids"},
+                         response.json())
+
+    def test_bulk_other_users_events(self):
+        other_period = FlowEventFactory()
+
+        response = self._post({'upsert': [{'id': other_period.id, 'level': 1}],
+                               'delete': [other_period.id]})
+
+        self.assertEqual(400, response.status_code)
+        self.assertTrue(period_models.FlowEvent.objects.filter(pk=other_period.id).exists())
+
+
+class TestFlowEventExport(LoggedInUserTestCase):
+
+    def setUp(self):
+        super(TestFlowEventExport, self).setUp()
+        self.url_path = reverse('periods-export')
+        self.period = FlowEventFactory(user=self.user, comment='first, "quoted"')
+        FlowEventFactory(user=self.user, first_day=False, level=period_models.FlowLevel.HEAVY,
+                         timestamp=pytz.utc.localize(datetime.datetime(2014, 2, 1)))
+        FlowEventFactory()
+
+    def test_export_csv(self):
+        response = self.client.get(self.url_path, {'format': 'csv'})
+
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response.streaming)
+        self.assertEqual('text/csv; charset=utf-8', response['Content-Type'])
+        self.assertEqual('attachment; filename="flow_events.csv"',
+                         response['Content-Disposition'])
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(['id,timestamp,first_day,level,color,clots,cramps,comment',
+                          '%s,2014-01-31T17:00:00+00:00,True,2,2,,,"first, ""quoted"""' %
+                          self.period.id], lines[:2])
+        self.assertEqual(3, len(lines))
+
+    def test_export_ndjson(self):
+        response = self.client.get(self.url_path, {'format': 'ndjson'})
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('application/x-ndjson; charset=utf-8', response['Content-Type'])
+        rows = [json.loads(line) for line in
+                b''.join(response.streaming_content).decode('utf-8').splitlines()]
+        self.assertEqual(2, len(rows))
+        self.assertEqual({'id': self.period.id, 'timestamp': '2014-01-31T17:00:00+00:00',
+                          'first_day': True, 'level': 2, 'color': 2, 'clots': None,
+                          'cramps': None, 'comment': 'first, "quoted"'}, rows[0])
+        self.assertEqual(period_models.FlowLevel.HEAVY, rows[1]['level'])
+
+    def test_export_filtered(self):
+        response = self.client.get(self.url_path, {'format': 'ndjson',
+                                                   'min_timestamp': '2014-02-01'})
+
+        rows = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(1, len(rows))
+
+    def test_export_unknown_format(self):
+        response = self.client.get(self.url_path, {'format': 'xml'})
+
+        self.assertEqual(404, response.status_code)
+
+
+class TestFlowEventImport(LoggedInUserTestCase):
+
+    def setUp(self):
+        super(TestFlowEventImport, self).setUp()
+        self.url_path = reverse('periods-import')
+
+    def _upload(self, name, content):
+        return self.client.post(self.url_path, {'file': SimpleUploadedFile(name, content)})
+
+    @patch('periods.models.recompute_statistics')
+    def test_import_csv(self, mock_recompute):
+        content = (b'id,timestamp,first_day,level,color,clots,cramps,comment\n'
+                   b'7,2014-01-31T17:00:00+00:00,True,2,2,,,"first, ""quoted"""\n'
+                   b'8,2014-02-01T17:00:00+00:00,False,3,,,,\n')
+
+        response = self._upload('export.csv', content)
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual({'created': 2, 'failed': 0, 'errors': [], 'format': 'csv'},
+                         response.json())
+        events = self.user.flow_events.order_by('timestamp')
+        self.assertEqual('first, "quoted"', events[0].comment)
+        self.assertTrue(events[0].first_day)
+        self.assertEqual(period_models.FlowLevel.HEAVY, events[1].level)
+        self.assertEqual(period_models.FlowColor.RED, events[1].color)
+        mock_recompute.assert_called_once_with(self.user)
+
+    def test_import_ndjson_with_errors(self):
+        content = (b'{"timestamp": "2014-01-31T17:00:00+00:00", "first_day": true}\n'
+                   b'\n'
+                   b'{"timestamp": "not a date"}\n'
+                   b'not json\n'
+                   b'{"timestamp": "2014-02-28T17:00:00+00:00", "first_day": true}\n')
+
+        response = self._upload('export.ndjson', content)
+
+        self.assertEqual(200, response.status_code)
+        summary = response.json()
+        self.assertEqual(2, summary['created'])
+        self.assertEqual(2, summary['failed'])
+        self.assertEqual([3, 4], [error['line'] for error in summary['errors']])
+        self.assertIn('timestamp', summary['errors'][0]['errors'])
+        self.assertEqual([28], list(self.user.get_cycle_lengths()))
+
+    def test_import_guess_format(self):
+        response = self._upload('events', b'{"timestamp": "2014-01-31T17:00:00+00:00"}\n')
+
+        self.assertEqual('ndjson', response.json()['format'])
+        self.assertEqual(1, self.user.flow_events.count())
+
+    @patch('periods.importers.MAX_REPORTED_ERRORS', 1)
+    def test_import_errors_capped(self):
+        response = self._upload('export.csv', b'timestamp\nbad\nworse\n')
+
+        self.assertEqual({'created': 0, 'failed': 2, 'format': 'csv',
+                          'errors': [{'line': 2, 'errors': ANY}]}, response.json())
+
+    def test_import_no_file(self):
+        response = self.client.post(self.url_path)
+
+        self.assertEqual(400, response.status_code)
+
+
+class TestFlowEventSync(LoggedInUserTestCase):
+
+    def setUp(self):
+        super(TestFlowEventSync, self).setUp()
+        self.url_path = reverse('periods-sync')
+        self.period = FlowEventFactory(user=self.user)
+        self.deleted_period = FlowEventFactory(
+            user=self.user, timestamp=pytz.utc.localize(datetime.datetime(2014, 2, 28)))
+        FlowEventFactory()
+
+    def test_sync_no_token(self):
+        self.deleted_period.delete()
+
+        response = self.client.get(self.url_path)
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual([self.period.id], [item['id'] for item in response.json()['updated']])
+        self.assertEqual([], response.json()['deleted'])
+        self.assertTrue(response.json()['token'])
+        self.assertTrue(response.json()['resync'])
+
+    def test_sync_with_token(self):
+        token = self.client.get(self.url_path).json()['token']
+        deleted_id = self.deleted_period.id
+        self.deleted_period.delete()
+        self.period.comment = 'updated'
+        self.period.save()
+        new_period = FlowEventFactory(
+            user=self.user, timestamp=pytz.utc.localize(datetime.datetime(2014, 3, 28)))
+
+        response = self.client.get(self.url_path, {'token': token})
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual([self.period.id, new_period.id],
+                         [item['id'] for item in response.json()['updated']])
+        self.assertEqual([deleted_id], response.json()['deleted'])
+        self.assertNotEqual(token, response.json()['token'])
+
+    @override_settings(SYNC_TOKEN_MARGIN=0)
+    def test_sync_nothing_changed(self):
+        token = self.client.get(self.url_path).json()['token']
+
+        response = self.client.get(self.url_path, {'token': token})
+
+        self.assertEqual([], response.json()['updated'])
+        self.assertEqual([], response.json()['deleted'])
+        self.assertFalse(response.json()['resync'])
+
+    def test_sync_margin(self):
+        # A write stamped just before the previous sync, but committed after it, is sent again
+        token = self.client.get(self.url_path).json()['token']
+        period_models.FlowEvent.objects.filter(pk=self.period.pk).update(
+            updated_at=timezone.now() - datetime.timedelta(seconds=60), comment='late')
+
+        response = self.client.get(self.url_path, {'token': token})
+
+        self.assertIn(self.period.id, [item['id'] for item in response.json()['updated']])
+
+    def test_sync_expired_token(self):
+        token = signing.dumps((timezone.now() - datetime.timedelta(days=91)).isoformat(),
+                              salt=views.SYNC_TOKEN_SALT)
+        self.deleted_period.delete()
+
+        response = self.client.get(self.url_path, {'token': token})
+
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response.json()['resync'])
+        self.assertEqual([self.period.id], [item['id'] for item in response.json()['updated']])
+        self.assertEqual([], response.json()['deleted'])
+
+    def test_sync_invalid_token(self):
+        response = self.client.get(self.url_path, {'token': 'bogus'})
+
+        self.assertEqual(400, response.status_code)
+        self.assertEqual({'error': 'Invalid sync token'}, response.json())
+
+
+class TestConditionalGet(LoggedInUserTestCase):
+
+    def setUp(self):
+        super(TestConditionalGet, self).setUp()
+        self.period = FlowEventFactory(user=self.user)
+        self.url_path = reverse('periods-list')
+
+    def _get_etag(self, url_path):
+        response = self.client.get(url_path)
+        self.assertEqual(200, response.status_code)
+        return response['ETag']
+
+    def test_get_not_modified(self):
+        etag = self._get_etag(self.url_path)
+
+        # Only session, user and data version; the events are not fetched
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url_path, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(b'', response.content)
+        self.assertEqual(etag, response['ETag'])
+
+    def test_get_no_statistics(self):
+        period_models.Statistics.objects.filter(user=self.user).delete()
+
+        response = self.client.get(self.url_path)
+
+        self.assertEqual(200, response.status_code)
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_get_stale_etag(self):
+        response = self.client.get(self.url_path, HTTP_IF_NONE_MATCH='"stale"')
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(1, len(response.json()))
+
+    def test_etag_changes_with_data(self):
+        etag = self._get_etag(self.url_path)
+
+        FlowEventFactory(user=self.user,
+                         timestamp=pytz.utc.localize(datetime.datetime(2014, 2, 28)))
+        response = self.client.get(self.url_path, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(2, len(response.json()))
+        self.assertNotEqual(etag, response['ETag'])
+
+    @override_settings(STATISTICS_UPDATE_MODE='queue')
+    def test_etag_changes_with_data_statistics_queued(self):
+        etag = self._get_etag(self.url_path)
+
+        self.period.delete()
+
+        self.assertNotEqual(etag, self._get_etag(self.url_path))
+
+    @override_settings(STATISTICS_UPDATE_MODE='on_commit')
+    def test_etag_changes_with_data_statistics_on_commit(self):
+        etag = self._get_etag(self.url_path)
+
+        self.period.delete()
+
+        self.assertNotEqual(etag, self._get_etag(self.url_path))
+
+    def test_etag_from_database(self):
+        # Writes handled by other processes, with their own caches, change the data version
+        etag = self._get_etag(self.url_path)
+
+        period_models.Statistics.objects.filter(user=self.user).update(data_version=100)
+
+        self.assertNotEqual(etag, self._get_etag(self.url_path))
+
+    def test_etag_differs_by_query(self):
+        etag = self._get_etag(self.url_path)
+
+        self.assertNotEqual(etag, self._get_etag('%s?min_timestamp=2014-02-01' % self.url_path))
+
+    @patch('periods.models.today')
+    def test_etag_changes_with_day(self, mock_today):
+        mock_today.return_value = pytz.utc.localize(datetime.datetime(2014, 2, 1, 12))
+        etag = self._get_etag(reverse('statistics-list'))
+
+        mock_today.return_value = pytz.utc.localize(datetime.datetime(2014, 2, 2, 12))
+
+        self.assertNotEqual(etag, self._get_etag(reverse('statistics-list')))
+
+    def test_etag_changes_with_luteal_phase_length(self):
+        etag = self._get_etag(reverse('statistics-list'))
+
+        self.user.luteal_phase_length = 12
+        self.user.save()
+
+        self.assertNotEqual(etag, self._get_etag(reverse('statistics-list')))
+
+    def test_json_view_not_modified(self):
+        url_path = '%scycle_length_frequency/' % reverse('statistics')
+        etag = self._get_etag(url_path)
+
+        with patch('periods.models.User.get_cycle_lengths') as mock_get_cycle_lengths:
+            response = self.client.get(url_path, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(304, response.status_code)
+        self.assertFalse(mock_get_cycle_lengths.called)
+
+    def test_post_not_conditional(self):
+        response = self.client.post(self.url_path, {'timestamp': '2014-02-28T00:00:00Z'},
+                                    HTTP_IF_NONE_MATCH='*')
+
+        self.assertEqual(201, response.status_code)
+
+
 class TestStatisticsViewSet(TestCase):
 
     def setUp(self):
@@ -99,6 +500,110 @@ class TestStatisticsViewSet(TestCase):
         self.assertEqual(1, response.data['first_day'])
 
 
+class TestTokenAuthenticatedRequests(TestCase):
+
+    def setUp(self):
+        self.user = UserFactory()
+        self.client = Client()
+
+    def test_no_session_created(self):
+        auth_header = 'Token %s' % self.user.auth_token.key
+        for i in range(3):
+            response = self.client.get(reverse('periods-list'), HTTP_AUTHORIZATION=auth_header)
+            self.assertEqual(200, response.status_code)
+
+        self.assertNotIn('sessionid', response.cookies)
+        self.assertNotIn('auth_token', response.cookies)
+        self.assertEqual(0, Session.objects.count())
+
+
+class TestCalendarDataView(LoggedInUserTestCase):
+
+    def setUp(self):
+        super(TestCalendarDataView, self).setUp()
+        self.url_path = reverse('calendar_data')
+        self.period = FlowEventFactory(user=self.user)
+        FlowEventFactory(user=self.user,
+                         timestamp=pytz.utc.localize(datetime.datetime(2014, 2, 28)))
+        self.other_user_period = FlowEventFactory()
+
+    @patch('periods.models.AerisData.get_for_date')
+    def test_get(self, mock_get_for_date):
+        mock_get_for_date.return_value = {'error': False, 'phasedata': []}
+
+        response = self.client.get(self.url_path, {'min_timestamp': '2014-01-05',
+                                                   'max_timestamp': '2014-02-15'})
+
+        self.assertEqual(200, response.status_code)
+        data = response.json()
+        self.assertEqual([self.period.pk], [event['id'] for event in data['events']])
+        self.assertEqual(28, data['statistics']['average_cycle_length'])
+        self.assertEqual('2014-01-31', data['statistics']['first_date'])
+        self.assertEqual(1, data['statistics']['first_day'])
+        self.assertEqual({'error': False, 'phasedata': []}, data['moon_phases'])
+        mock_get_for_date.assert_called_once_with('2014-01-05', '2014-02-15')
+        self.assertTrue(response.has_header('ETag'))
+
+    @patch('periods.models.AerisData.get_for_date')
+    def test_get_no_moon_phases(self, mock_get_for_date):
+        mock_get_for_date.return_value = None
+
+        response = self.client.get(self.url_path, {'min_timestamp': '2014-01-05',
+                                                   'max_timestamp': '2014-03-15'})
+
+        self.assertEqual(200, response.status_code)
+        data = response.json()
+        self.assertEqual(2, len(data['events']))
+        self.assertEqual({}, data['moon_phases'])
+
+    @patch('periods.models.AerisData.get_for_date')
+    def test_get_moon_phases_error(self, mock_get_for_date):
+        mock_get_for_date.return_value = {'error': 'Unable to reach Moon Phase API'}
+
+        response = self.client.get(self.url_path, {'min_timestamp': '2014-01-05',
+                                                   'max_timestamp': '2014-02-15'})
+
+        # Not cached by the client, so the moon phases are fetched again
+        self.assertEqual(200, response.status_code)
+        self.assertFalse(response.has_header('ETag'))
+
+    @patch('periods.models.AerisData.get_for_date')
+    def test_get_missing_timestamp(self, mock_get_for_date):
+        response = self.client.get(self.url_path, {'min_timestamp': '2014-01-05'})
+
+        self.assertEqual(400, response.status_code)
+        self.assertIn('max_timestamp', response.json()['error'])
+        self.assertFalse(mock_get_for_date.called)
+
+    @patch('periods.models.AerisData.get_for_date')
+    def test_get_invalid_timestamp(self, mock_get_for_date):
+        response = self.client.get(self.url_path, {'min_timestamp': '2014-01-05',
+                                                   'max_timestamp': 'tomorrow'})
+
+        self.assertEqual(400, response.status_code)
+        self.assertFalse(mock_get_for_date.called)
+
+    @patch('periods.models.AerisData.get_for_date')
+    def test_get_query_count(self, mock_get_for_date):
+        mock_get_for_date.return_value = {}
+
+        # The first request caches the auth token key in the session
+        self.client.get(self.url_path, {'min_timestamp': '2014-01-05',
+                                        'max_timestamp': '2014-02-15'})
+
+        # Session and user, then statistics, previous and next periods, and events
+        with self.assertNumQueries(6):
+            self.client.get(self.url_path, {'min_timestamp': '2014-01-05',
+                                            'max_timestamp': '2014-02-15'})
+
+    def test_get_not_logged_in(self):
+        self.client.logout()
+
+        response = self.client.get(self.url_path)
+
+        self.assertEqual(401, response.status_code)
+
+
 class TestAerisView(LoggedInUserTestCase):
     maxDiff = None
 
@@ -128,6 +633,27 @@ class TestAerisView(LoggedInUserTestCase):
         self.assertTrue(mock_get_for_date.called_once_with(None, to_date))
 
 
+class TestCacheStatsView(LoggedInUserTestCase):
+
+    def setUp(self):
+        super(TestCacheStatsView, self).setUp()
+        self.url_path = reverse('cache_stats')
+
+    def test_get_not_staff(self):
+        response = self.client.get(self.url_path)
+
+        self.assertEqual(403, response.status_code)
+
+    def test_get_staff(self):
+        self.user.is_staff = True
+        self.user.save()
+
+        response = self.client.get(self.url_path)
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(['cycle_lengths', 'sorted_cycle_lengths'], sorted(response.json()))
+
+
 class TestFlowEventMixin(LoggedInUserTestCase):
 
     def setUp(self):
@@ -269,6 +795,33 @@ class TestFlowEventFormSetView(LoggedInUserTestCase):
         self.assertContains(response, '*Note: all times in UTC')
         self.assertContains(response, 'name="form-INITIAL_FORMS" type="hidden" value="0"')
 
+    @patch('periods.models.recompute_statistics')
+    def test_post(self, mock_recompute_statistics):
+        periods = [FlowEventFactory(user=self.user),
+                   FlowEventFactory(user=self.user,
+                                    timestamp=pytz.utc.localize(datetime.datetime(2014, 2, 28)))]
+        data = {
+            'form-TOTAL_FORMS': '2',
+            'form-INITIAL_FORMS': '2',
+            'form-MIN_NUM_FORMS': '0',
+            'form-MAX_NUM_FORMS': '1000',
+        }
+        for i, period in enumerate(periods):
+            data.update({
+                'form-%s-id' % i: period.id,
+                'form-%s-timestamp' % i: '2014-03-%02d 00:00:00' % (i + 1),
+                'form-%s-first_day' % i: 'on',
+                'form-%s-level' % i: '1',
+                'form-%s-color' % i: '1',
+            })
+        mock_recompute_statistics.reset_mock()
+
+        response = self.client.post(self.url_path, data=data)
+
+        self.assertEqual(302, response.status_code)
+        mock_recompute_statistics.assert_called_once_with(self.user)
+        self.assertEqual([1], list(self.user.completed_cycles().values_list('length', flat=True)))
+
 
 class TestCalendarView(LoggedInUserTestCase):
     def setUp(self):
@@ -280,6 +833,7 @@ class TestCalendarView(LoggedInUserTestCase):
 
         self.assertEqual(200, response.status_code)
         self.assertContains(response, 'initializeCalendar(')
+        self.assertContains(response, reverse('calendar_data'))
         self.assertContains(response, 'div id=\'id_calendar\'></div>')
 
 
@@ -447,3 +1001,16 @@ class RegenerateKeyView(LoggedInUserTestCase):
         self.assertEqual([('/accounts/profile/api_info/', 302)], response.redirect_chain)
         user = period_models.User.objects.get(pk=self.user.pk)
         self.assertNotEquals(api_key, user.auth_token.key)
+        self.assertEqual(user.auth_token.key, self.client.session['auth_token']['key'])
+        self.assertEqual(user.auth_token.key, self.client.cookies['auth_token'].value)
+
+    def test_post_old_key_rejected(self):
+        api_key = Token.objects.get(user=self.user).key
+        periods_url = reverse('periods-list')
+        self.assertEqual(200, self.client.get(
+            periods_url, HTTP_AUTHORIZATION='Token %s' % api_key).status_code)
+
+        self.client.post(self.url_path)
+
+        response = self.client.get(periods_url, HTTP_AUTHORIZATION='Token %s' % api_key)
+        self.assertEqual(401, response.status_code)
@@ -20,7 +20,9 @@ urlpatterns = [
 
     url(r'^api/v2/', include(router.urls)),
     url(r'^api/v2/authenticate/$', period_views.ApiAuthenticateView.as_view(), name='authenticate'),
+    url(r'^api/v2/calendar/$', period_views.CalendarDataView.as_view(), name='calendar_data'),
     url(r'^api/v2/aeris/$', period_views.AerisView.as_view(), name='aeris'),
+    url(r'^api/v2/cache_stats/$', period_views.CacheStatsView.as_view(), name='cache_stats'),
     url(r'^flow_event/$', period_views.FlowEventCreateView.as_view(), name='flow_event_create'),
     url(r'^flow_event/(?P<pk>[0-9]+)/$', period_views.FlowEventUpdateView.as_view(),
         name='flow_event_update'),
@@ -1,37 +1,238 @@
 from collections import Counter
 import datetime
+import functools
+import hashlib
 import itertools
 import math
 import pytz
 
 from django.conf import settings
 from django.contrib import auth
-from django.contrib.auth.mixins import LoginRequiredMixin
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.core import signing
 from django.core.urlresolvers import reverse
-from django.http import HttpResponseRedirect
+from django.db import connection, transaction
+from django.http import HttpResponseNotModified, HttpResponseRedirect, StreamingHttpResponse
+from django.http.response import HttpResponseBase
+from django.utils import timezone
 from django.utils.dateparse import parse_datetime
+from django.utils.http import parse_etags, quote_etag
 from django.views.generic import CreateView, TemplateView, UpdateView
 
 from extra_views import ModelFormSetView
 from jsonview.views import JsonView
 from rest_framework import permissions, status, viewsets
 from rest_framework.authtoken.models import Token
+from rest_framework.decorators import list_route
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from periods import forms as period_forms, models as period_models, serializers
+from periods import (authentication, caching, exporters, forms as period_forms, helpers,
+                     importers, middleware, models as period_models, serializers)
+from periods.pagination import TimestampKeysetPagination
+
+
+SYNC_TOKEN_SALT = 'periods.sync'
+BULK_UPDATE_FIELDS = ['timestamp', 'first_day', 'level', 'color', 'clots', 'cramps', 'comment',
+                      'updated_at']
+
+
+def _get_min_timestamp(request):
+    # Parse the min_timestamp query parameter in the user's timezone, defaulting to today
+    min_timestamp = request.query_params.get('min_timestamp')
+    try:
+        min_timestamp = datetime.datetime.strptime(min_timestamp, settings.API_DATE_FORMAT)
+        return pytz.timezone(request.user.timezone.zone).localize(min_timestamp)
+    except TypeError:
+        return period_models.today()
+
+
+def _is_id(value):
+    # JSON true and false are parsed as bool, which is a subclass of int
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _get_etag(request):
+    # Everything a user's GET responses depend on: their data, via the version that is bumped in
+    # the database whenever it changes, the settings used in computations, and the day, for
+    # projections. None, for no ETag, if the user has no statistics (and so no data version).
+    user = request.user
+    try:
+        data_version = user.statistics.data_version
+    except period_models.Statistics.DoesNotExist:
+        return None
+    validator = ':'.join(str(value) for value in [
+        user.pk, data_version, user.timezone.zone, user.luteal_phase_length,
+        user.birth_date, period_models.today().astimezone(user.timezone).date(),
+        request.get_full_path(), request.META.get('HTTP_ACCEPT', '')])
+    return hashlib.md5(validator.encode('utf-8')).hexdigest()
+
+
+def conditional_get(view_method):
+    # Answer GETs with 304 Not Modified when the client's ETag is current, before doing any work.
+    # Views can leave a response without an ETag by setting its no_etag attribute, e.g. when it
+    # includes data that failed to load and should be fetched again.
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view_method(self, request, *args, **kwargs)
+        etag = _get_etag(request)
+        if etag is None:
+            return view_method(self, request, *args, **kwargs)
+        if_none_match = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+        if etag in if_none_match or '*' in if_none_match:
+            response = HttpResponseNotModified()
+            response['ETag'] = quote_etag(etag)
+            return response
+        response = view_method(self, request, *args, **kwargs)
+        if not isinstance(response, HttpResponseBase):
+            # JsonView returns the data, with optional status and headers
+            return response, 200, {'ETag': quote_etag(etag)}
+        if response.status_code == 200 and not getattr(response, 'no_etag', False):
+            response['ETag'] = quote_etag(etag)
+        return response
+    return wrapper
+
+
+class ConditionalGetMixin(object):
+    @conditional_get
+    def get(self, request, *args, **kwargs):
+        return super(ConditionalGetMixin, self).get(request, *args, **kwargs)
 
 
 class FlowEventViewSet(viewsets.ModelViewSet):
     serializer_class = serializers.FlowEventSerializer
     filter_class = serializers.FlowEventFilter
+    pagination_class = TimestampKeysetPagination
 
     def get_queryset(self):
         return period_models.FlowEvent.objects.filter(user=self.request.user)
 
+    @conditional_get
+    def list(self, request, *args, **kwargs):
+        return super(FlowEventViewSet, self).list(request, *args, **kwargs)
+
+    @conditional_get
+    def retrieve(self, request, *args, **kwargs):
+        return super(FlowEventViewSet, self).retrieve(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    @list_route(methods=['post'])
+    def bulk(self, request, *args, **kwargs):
+        # Apply a batch of upserts and deletes in one transaction, recomputing statistics once
+        if isinstance(request.data, dict):
+            upserts = request.data.get('upsert', [])
+            delete_ids = request.data.get('delete', [])
+        else:
+            upserts = delete_ids = None
+        valid = (isinstance(upserts, list) and isinstance(delete_ids, list) and
+                 all(_is_id(pk) for pk in delete_ids))
+        if not valid:
+            return Response({'error': "'upsert' must be a list and 'delete' a list of ids"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        update_ids = [item.get('id') for item in upserts if isinstance(item, dict)]
+        existing = self.get_queryset().in_bulk([pk for pk in update_ids if _is_id(pk)])
+        to_create = []
+        to_update = []
+        errors = {}
+        for i, item in enumerate(upserts):
+            pk = item.get('id') if isinstance(item, dict) else None
+            if pk is None:
+                serializer = self.get_serializer(data=item)
+            elif _is_id(pk) and pk in existing:
+                serializer = self.get_serializer(existing[pk], data=item, partial=True)
+            else:
+                errors[i] = {'id': ['Not found.']}
+                continue
+            if not serializer.is_valid():
+                errors[i] = serializer.errors
+            elif pk is None:
+                to_create.append(period_models.FlowEvent(user=request.user,
+                                                         **serializer.validated_data))
+            else:
+                for attr, value in serializer.validated_data.items():
+                    setattr(existing[pk], attr, value)
+                existing[pk].updated_at = timezone.now()
+                to_update.append(existing[pk])
+        if errors:
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic(), period_models.FlowEventBatch(request.user):
+            if connection.features.can_return_ids_from_bulk_insert:
+                period_models.FlowEvent.objects.bulk_create(to_create)
+            else:
+                # The ids of the created events are returned, so they must be set
+                for flow_event in to_create:
+                    flow_event.save()
+            helpers.bulk_update(to_update, BULK_UPDATE_FIELDS)
+            deleted = self.get_queryset().filter(pk__in=delete_ids).delete()[1]
+
+        return Response({
+            'created': len(to_create),
+            'created_ids': [flow_event.pk for flow_event in to_create],
+            'updated': len(to_update),
+            'deleted': deleted.get(period_models.FlowEvent._meta.label, 0),
+        })
+
+    @list_route(renderer_classes=exporters.RENDERERS)
+    def export(self, request, *args, **kwargs):
+        # Stream all of the user's events as CSV or NDJSON, e.g. ?format=csv
+        export_format = request.accepted_renderer.format
+        rows = exporters.iter_rows(self.filter_queryset(self.get_queryset()))
+        response = StreamingHttpResponse(exporters.LINES[export_format](rows),
+                                         content_type='%s; charset=utf-8' %
+                                         request.accepted_renderer.media_type)
+        response['Content-Disposition'] = 'attachment; filename="flow_events.%s"' % export_format
+        return response
+
+    @list_route(methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def import_events(self, request, *args, **kwargs):
+        # Create events from an uploaded CSV or NDJSON file, in the export format
+        upload = request.FILES.get('file')
+        if not upload:
+            return Response({'error': "Upload a CSV or NDJSON file as 'file'"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        import_format = importers.get_format(upload)
+        summary = importers.import_flow_events(request.user,
+                                               importers.ROWS[import_format](upload))
+        summary['format'] = import_format
+        return Response(summary)
+
+    @list_route()
+    @conditional_get
+    def sync(self, request, *args, **kwargs):
+        # Return events changed and ids of events deleted since the time encoded in the token,
+        # less a margin for writes that committed after a previous sync read past them. Tokens
+        # older than the tombstone retention get everything, flagged as a resync.
+        now = timezone.now()
+        updated = self.get_queryset()
+        deleted = period_models.DeletedFlowEvent.objects.none()
+        resync = True
+        token = request.query_params.get('token')
+        if token:
+            try:
+                since = parse_datetime(signing.loads(token, salt=SYNC_TOKEN_SALT))
+            except signing.BadSignature:
+                return Response({'error': 'Invalid sync token'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            if since >= period_models.get_tombstone_cutoff(now):
+                since -= datetime.timedelta(seconds=settings.SYNC_TOKEN_MARGIN)
+                updated = updated.filter(updated_at__gte=since)
+                deleted = request.user.deleted_flow_events.filter(deleted_at__gte=since)
+                resync = False
+
+        serializer = self.get_serializer(updated.order_by('updated_at', 'id'), many=True)
+        return Response({
+            'token': signing.dumps(now.isoformat(), salt=SYNC_TOKEN_SALT),
+            'resync': resync,
+            'updated': serializer.data,
+            'deleted': list(deleted.values_list('flow_event_id', flat=True)),
+        })
+
 
 class StatisticsViewSet(viewsets.ModelViewSet):
     serializer_class = serializers.StatisticsSerializer
@@ -39,21 +240,51 @@ class StatisticsViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return period_models.Statistics.objects.filter(user=self.request.user)
 
+    @conditional_get
+    def retrieve(self, request, *args, **kwargs):
+        return super(StatisticsViewSet, self).retrieve(request, *args, **kwargs)
+
+    @conditional_get
     def list(self, request, *args, **kwargs):
         # Only return a single statistics object, for the authenticated user
-        min_timestamp = request.query_params.get('min_timestamp')
-        try:
-            min_timestamp = datetime.datetime.strptime(min_timestamp, settings.API_DATE_FORMAT)
-            min_timestamp = pytz.timezone(request.user.timezone.zone).localize(min_timestamp)
-        except TypeError:
-            min_timestamp = period_models.today()
         queryset = self.filter_queryset(self.get_queryset())
         instance = queryset[0]
-        instance.set_start_date_and_day(min_timestamp)
+        instance.set_start_date_and_day(_get_min_timestamp(request))
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
 
 
+class CalendarDataView(APIView):
+    # Everything the calendar displays for a date range, in one response
+
+    @conditional_get
+    def get(self, request, *args, **kwargs):
+        min_timestamp = request.query_params.get('min_timestamp')
+        max_timestamp = request.query_params.get('max_timestamp')
+        try:
+            for timestamp in (min_timestamp, max_timestamp):
+                datetime.datetime.strptime(timestamp, settings.API_DATE_FORMAT)
+        except (TypeError, ValueError):
+            return Response({'error': "'min_timestamp' and 'max_timestamp' must be dates in the "
+                                      "format %s" % settings.API_DATE_FORMAT},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        flow_events = serializers.FlowEventFilter(
+            request.query_params,
+            queryset=period_models.FlowEvent.objects.filter(user=request.user)).qs
+        statistics = request.user.statistics
+        statistics.set_start_date_and_day(_get_min_timestamp(request))
+        moon_phases = period_models.AerisData.get_for_date(min_timestamp, max_timestamp)
+        response = Response({
+            'events': serializers.FlowEventSerializer(flow_events, many=True).data,
+            'statistics': serializers.StatisticsSerializer(statistics).data,
+            'moon_phases': moon_phases or {},
+        })
+        # The ETag does not cover the moon phases, which are stored once fetched successfully
+        response.no_etag = not moon_phases or bool(moon_phases.get('error'))
+        return response
+
+
 class ApiAuthenticateView(APIView):
     http_method_names = ['post']
     permission_classes = [permissions.AllowAny]
@@ -90,6 +321,18 @@ class AerisView(LoginRequiredMixin, JsonView):
         return context
 
 
+class CacheStatsView(LoginRequiredMixin, UserPassesTestMixin, JsonView):
+    raise_exception = True
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get_context_data(self, **kwargs):
+        context = super(CacheStatsView, self).get_context_data(**kwargs)
+        context.update(caching.get_stats())
+        return context
+
+
 class FlowEventMixin(LoginRequiredMixin):
     model = period_models.FlowEvent
     form_class = period_forms.PeriodForm
@@ -149,20 +392,24 @@ class FlowEventFormSetView(LoginRequiredMixin, ModelFormSetView):
         queryset = self.model.objects.filter(user=self.request.user).order_by('timestamp')
         return queryset
 
+    def formset_valid(self, formset):
+        # Save all rows, then rebuild cycles and statistics once rather than once per row
+        with transaction.atomic(), period_models.FlowEventBatch(self.request.user):
+            return super(FlowEventFormSetView, self).formset_valid(formset)
+
 
 class CalendarView(LoginRequiredMixin, TemplateView):
     template_name = 'periods/calendar.html'
 
     def get_context_data(self, **kwargs):
         context = super(CalendarView, self).get_context_data(**kwargs)
+        context['calendar_data_url'] = self.request.build_absolute_uri(reverse('calendar_data'))
         context['periods_url'] = self.request.build_absolute_uri(reverse('periods-list'))
-        context['statistics_url'] = self.request.build_absolute_uri(reverse('statistics-list'))
         context['flow_event_url'] = self.request.build_absolute_uri(reverse('flow_event_create'))
-        context['aeris_url'] = self.request.build_absolute_uri(reverse('aeris'))
         return context
 
 
-class CycleLengthFrequencyView(LoginRequiredMixin, JsonView):
+class CycleLengthFrequencyView(LoginRequiredMixin, ConditionalGetMixin, JsonView):
     def get_context_data(self, **kwargs):
         context = super(CycleLengthFrequencyView, self).get_context_data(**kwargs)
         cycle_lengths = self.request.user.get_cycle_lengths()
@@ -174,16 +421,12 @@ class CycleLengthFrequencyView(LoginRequiredMixin, JsonView):
         return context
 
 
-class CycleLengthHistoryView(LoginRequiredMixin, JsonView):
+class CycleLengthHistoryView(LoginRequiredMixin, ConditionalGetMixin, JsonView):
     def get_context_data(self, **kwargs):
         context = super(CycleLengthHistoryView, self).get_context_data(**kwargs)
-        cycle_lengths = self.request.user.get_cycle_lengths()
-        cycles = []
-        if cycle_lengths:
-            first_days = list(self.request.user.first_days().values_list('timestamp', flat=True))
-            cycles = list(zip(
-                [x.strftime(settings.API_DATE_FORMAT) for x in first_days], cycle_lengths))
-        context['cycles'] = cycles
+        cycles = self.request.user.completed_cycles().values_list('start_date', 'length')
+        context['cycles'] = [(start_date.strftime(settings.API_DATE_FORMAT), length)
+                             for start_date, length in cycles]
         return context
 
 
@@ -214,7 +457,7 @@ def _generate_cycles(start_date, today, end_date, cycle_length):
     return cycles
 
 
-class QigongCycleView(LoginRequiredMixin, JsonView):
+class QigongCycleView(LoginRequiredMixin, ConditionalGetMixin, JsonView):
     def get_context_data(self, **kwargs):
         context = super(QigongCycleView, self).get_context_data(**kwargs)
         today = period_models.today()
@@ -270,7 +513,11 @@ class RegenerateKeyView(LoginRequiredMixin, UpdateView):
     http_method_names = ['post']
 
     def post(self, request, *args, **kwargs):
-        Token.objects.filter(user=request.user).delete()
-        Token.objects.create(user=request.user)
+        tokens = Token.objects.filter(user=request.user)
+        for key in tokens.values_list('key', flat=True):
+            authentication.invalidate_token(key)
+        tokens.delete()
+        token = Token.objects.create(user=request.user)
+        middleware.set_session_token(request.session, token.key)
 
         return HttpResponseRedirect(reverse('api_info'))
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""
+Benchmark rendering of the notification email templates, looking each template up through the
+Django template loader for every email versus using the cached templates from
+periods.email_sender.get_template.
+
+Each notification type is rendered (text and HTML) for the given number of synthetic users, and
+throughput is reported per 10k users. No database is needed. Example:
+
+    python scripts/benchmark_email_templates.py --users 10000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), os.path.pardir)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'eggtimer.settings')
+
+import django  # noqa: E402
+django.setup()
+
+from django.template import loader  # noqa: E402
+
+from periods import email_sender  # noqa: E402
+
+TEMPLATE_NAMES = ['expected_ago', 'expected_now', 'expected_in', 'ovulating']
+
+
+def get_context(i):
+    return {
+        'full_name': 'User %s' % i,
+        'today': 'Friday March 28, 2014',
+        'expected_in': i % 4,
+        'day': 'days',
+        'expected_date': 'Monday March 31, 2014',
+        'calendar_start_date': 'Monday March 24, 2014',
+        'admin_name': 'admin',
+        'full_domain': 'https://example.com',
+    }
+
+
+def uncached(template_name):
+    return loader.get_template('periods/email/%s' % template_name)
+
+
+def run(get_template, num_users):
+    started = time.time()
+    for i in range(num_users):
+        template_name = TEMPLATE_NAMES[i % len(TEMPLATE_NAMES)]
+        context = get_context(i)
+        get_template('%s.txt' % template_name).render(context)
+        get_template('%s.html' % template_name).render(context)
+    return time.time() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10000)
+    args = parser.parse_args()
+
+    for label, get_template in (('get_template per email', uncached),
+                                ('cached templates', email_sender.get_template)):
+        elapsed = run(get_template, args.users)
+        print('%s: %.3f s for %s users, %.3f s per 10k users, %.0f users/s' % (
+            label, elapsed, args.users, elapsed * 10000 / args.users, args.users / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+"""
+Benchmark the hot FlowEvent queries with and without the composite indexes added in
+periods migration 0018.
+
+A throwaway test database is created (never the configured one), seeded with synthetic users
+and flow events, and each query is timed and explained twice: first with all migrations applied,
+then with the composite indexes dropped. Example:
+
+    python scripts/benchmark_flow_event_queries.py --users 200 --years 10 --output report.txt
+"""
+import argparse
+import datetime
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), os.path.pardir)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'eggtimer.settings')
+
+import django  # noqa: E402
+django.setup()
+
+import pytz  # noqa: E402
+from django.db import connection  # noqa: E402
+
+from periods import models as period_models  # noqa: E402
+
+FIRST_DAY_INDEX_NAME = 'periods_flowevent_first_day_user_timestamp'
+EXPLAIN_PREFIXES = {
+    'postgresql': 'EXPLAIN ANALYZE ',
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+}
+
+
+def seed(num_users, num_years):
+    start = pytz.utc.localize(datetime.datetime(2000, 1, 1))
+    period_models.User.objects.bulk_create(
+        [period_models.User(email='benchmark_%s@example.com' % i) for i in range(num_users)])
+    users = list(period_models.User.objects.filter(email__startswith='benchmark_'))
+    for user in users:
+        events = []
+        timestamp = start
+        while timestamp < start + datetime.timedelta(days=365 * num_years):
+            for day in range(5):
+                events.append(period_models.FlowEvent(
+                    user=user, timestamp=timestamp + datetime.timedelta(days=day),
+                    first_day=(day == 0)))
+            timestamp += datetime.timedelta(days=random.randint(24, 34))
+        period_models.FlowEvent.objects.bulk_create(events)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    return users, start
+
+
+def get_queries(user, start):
+    middle = start + datetime.timedelta(days=365 * 5)
+    events = period_models.FlowEvent.objects.filter(user=user)
+    first_days = events.filter(first_day=True)
+    return [
+        ('first days in order', first_days.order_by('timestamp').values_list('timestamp')),
+        ('previous period', first_days.filter(timestamp__lte=middle).order_by('-timestamp')[:1]),
+        ('timestamp range', events.filter(timestamp__gte=middle,
+                                          timestamp__lte=middle + datetime.timedelta(days=42))),
+    ]
+
+
+def explain(queryset):
+    prefix = EXPLAIN_PREFIXES.get(connection.vendor)
+    if not prefix:
+        return 'EXPLAIN not supported for %s' % connection.vendor
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql, params)
+        return '\n'.join('    %s' % ' '.join('%s' % column for column in row)
+                         for row in cursor.fetchall())
+
+
+def run_phase(label, users, start, repeat, report):
+    report.append('=== %s ===' % label)
+    sample_queries = get_queries(users[0], start)
+    for i, (name, queryset) in enumerate(sample_queries):
+        timings = []
+        for _ in range(repeat):
+            queryset = get_queries(random.choice(users), start)[i][1]
+            started = time.time()
+            list(queryset)
+            timings.append((time.time() - started) * 1000)
+        report.append('%s: median %.3f ms, max %.3f ms over %s runs' % (
+            name, statistics.median(timings), max(timings), repeat))
+        report.append(explain(sample_queries[i][1]))
+
+
+def drop_indexes():
+    with connection.schema_editor() as schema_editor:
+        schema_editor.alter_index_together(period_models.FlowEvent, [('user', 'timestamp')], [])
+        schema_editor.execute('DROP INDEX IF EXISTS %s' % FIRST_DAY_INDEX_NAME)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--output', help='Also write the report to this file')
+    args = parser.parse_args()
+
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        users, start = seed(args.users, args.years)
+        report = ['%s users, %s flow events, %s' % (
+            len(users), period_models.FlowEvent.objects.count(), connection.vendor)]
+        run_phase('after (with composite indexes)', users, start, args.repeat, report)
+        drop_indexes()
+        run_phase('before (without composite indexes)', users, start, args.repeat, report)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    report = '\n'.join(report)
+    print(report)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(report + '\n')
+
+
+if __name__ == '__main__':
+    main()
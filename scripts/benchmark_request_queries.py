@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+"""
+Benchmark the database queries per request made by a logged in browser session, with the
+original AddAuthTokenMiddleware (which read the user's auth token on every response) versus the
+current one (which caches the token key in the session, and only sets the cookie when needed).
+
+A throwaway test database is created (never the configured one), with a user and some flow
+events, and each page and API view is requested repeatedly in one session. Example:
+
+    python scripts/benchmark_request_queries.py --repeat 50
+"""
+import argparse
+import datetime
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), os.path.pardir)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'eggtimer.settings')
+
+import django  # noqa: E402
+django.setup()
+
+import pytz  # noqa: E402
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client, override_settings  # noqa: E402
+from django.test.utils import CaptureQueriesContext, setup_test_environment  # noqa: E402
+
+from periods import models as period_models  # noqa: E402
+
+URL_PATHS = [
+    '/calendar/',
+    '/api/v2/periods/',
+    '/api/v2/statistics/',
+    '/statistics/cycle_length_frequency/',
+]
+MIDDLEWARE_PATH = 'periods.middleware.AddAuthTokenMiddleware'
+
+
+class LegacyAddAuthTokenMiddleware(object):
+    # The original middleware, for comparison
+    def process_response(self, request, response):
+        if hasattr(request, 'user') and request.user and request.user.is_authenticated():
+            auth_token = request.user.auth_token
+            if auth_token:
+                response.set_cookie('auth_token', auth_token)
+        return response
+
+
+def seed():
+    user = period_models.User.objects.create_user(email='benchmark@example.com',
+                                                  password='benchmark')
+    start = pytz.utc.localize(datetime.datetime(2016, 1, 1))
+    for cycle in range(12):
+        period_models.FlowEvent.objects.create(
+            user=user, timestamp=start + datetime.timedelta(days=28 * cycle), first_day=True)
+    return user
+
+
+def run_phase(label, middleware_path, user, repeat, report):
+    middleware_classes = [middleware_path if path == MIDDLEWARE_PATH else path
+                          for path in settings.MIDDLEWARE_CLASSES]
+    with override_settings(MIDDLEWARE_CLASSES=middleware_classes):
+        client = Client()
+        client.force_login(user)
+        report.append(label)
+        for url_path in URL_PATHS:
+            client.get(url_path)  # Warm up, as the first response may cache the token
+            started = time.time()
+            with CaptureQueriesContext(connection) as queries:
+                for i in range(repeat):
+                    client.get(url_path)
+            elapsed = time.time() - started
+            report.append('    %-40s %5.1f queries/request, %6.1f ms/request' % (
+                url_path, len(queries) / repeat, elapsed * 1000 / repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        user = seed()
+        report = []
+        run_phase('before (auth token read on every response)',
+                  '__main__.LegacyAddAuthTokenMiddleware', user, args.repeat, report)
+        run_phase('after (auth token cached in the session)',
+                  MIDDLEWARE_PATH, user, args.repeat, report)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    print('\n'.join(report))
+
+
+if __name__ == '__main__':
+    main()